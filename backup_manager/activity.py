@@ -0,0 +1,162 @@
+"""
+Local analytics store of Revit Server model activity.
+
+Usage:
+python -m backup_manager.activity edits <activity_db> [--since 2024-01-01]
+python -m backup_manager.activity idle <activity_db> [--days 30]
+"""
+import argparse
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+HISTORY_COLUMNS = ('Time', 'User', 'Version', 'Comment')
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%SZ'
+
+
+# noinspection SqlNoDataSourceInspection
+class ModelActivityStore:
+    """
+    Copies ModelHistory rows from every model's Model.db3 into one indexed SQLite database.
+
+    Only rows newer than a per-model watermark (the latest Time ingested) are read, so each
+    save is copied once, and ingestion reuses the connection the edit scan already opened.
+    Thread-safe.
+    """
+    CREATE_QUERIES = (
+        "CREATE TABLE IF NOT EXISTS ModelActivity ("
+        "ModelPath TEXT NOT NULL, Time TEXT NOT NULL, User TEXT, Version INTEGER, Comment TEXT)",
+        "CREATE INDEX IF NOT EXISTS ModelActivityByModel ON ModelActivity (ModelPath, Time)",
+        "CREATE INDEX IF NOT EXISTS ModelActivityByUser ON ModelActivity (User, Time)",
+        "CREATE INDEX IF NOT EXISTS ModelActivityByTime ON ModelActivity (Time)",
+        "CREATE TABLE IF NOT EXISTS ActivityWatermark ("
+        "ModelPath TEXT PRIMARY KEY, Watermark TEXT, IngestedAt REAL)"
+    )
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+        db_path (str): Path of the SQLite file.
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._connection:
+            for query in self.CREATE_QUERIES:
+                self._connection.execute(query)
+
+    def has_model(self, model_path):
+        """
+        Returns True if the model's history was ingested before.
+        """
+        return self.get_watermark(model_path) is not None
+
+    def get_watermark(self, model_path):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT Watermark FROM ActivityWatermark WHERE ModelPath = ?", (model_path,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def ingest(self, model_path, connection):
+        """
+        Copies the model's ModelHistory rows newer than its watermark.
+
+        Parameters:
+        model_path (str): The model's path on the Revit Server.
+        connection (sqlite3.Connection): An open connection to the model's Model.db3.
+
+        Returns:
+        int: The number of rows copied.
+        """
+        columns = {row[1].lower(): row[1] for row in connection.execute("PRAGMA table_info('ModelHistory')")}
+        if 'time' not in columns:
+            return 0
+        watermark = self.get_watermark(model_path) or ''
+        select = ', '.join(f'"{columns[name.lower()]}"' if name.lower() in columns else 'NULL'
+                           for name in HISTORY_COLUMNS)
+        rows = connection.execute(
+            f"SELECT {select} FROM ModelHistory WHERE \"{columns['time']}\" > ? ORDER BY 1", (watermark,)
+        ).fetchall()
+        new_watermark = rows[-1][0] if rows else watermark
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO ModelActivity (ModelPath, Time, User, Version, Comment) VALUES (?, ?, ?, ?, ?)",
+                [(model_path, *row) for row in rows]
+            )
+            self._connection.execute(
+                "INSERT INTO ActivityWatermark (ModelPath, Watermark, IngestedAt) VALUES (?, ?, ?) "
+                "ON CONFLICT(ModelPath) DO UPDATE SET Watermark = excluded.Watermark, IngestedAt = excluded.IngestedAt",
+                (model_path, new_watermark, time.time())
+            )
+        return len(rows)
+
+    def saves_since(self, timestamp):
+        """
+        Returns:
+        dict: The number of saves per model path since the given timestamp.
+        """
+        since = datetime.fromtimestamp(timestamp, timezone.utc).strftime(DATETIME_FORMAT)
+        with self._lock:
+            return dict(self._connection.execute(
+                "SELECT ModelPath, COUNT(*) FROM ModelActivity WHERE Time >= ? GROUP BY ModelPath", (since,)
+            ).fetchall())
+
+    def edits_per_user_per_day(self, since=None):
+        """
+        Returns:
+        list: (day, user, saves, models) tuples, newest day first.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT substr(Time, 1, 10) AS Day, User, COUNT(*), COUNT(DISTINCT ModelPath) "
+                "FROM ModelActivity WHERE Time >= ? GROUP BY Day, User ORDER BY Day DESC, User",
+                (since or '',)
+            ).fetchall()
+
+    def idle_models(self, days=30):
+        """
+        Returns:
+        list: (model path, last save time) of models not saved in the given number of days, longest idle first.
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).strftime(DATETIME_FORMAT)
+        with self._lock:
+            return self._connection.execute(
+                "SELECT ModelPath, Watermark FROM ActivityWatermark WHERE Watermark < ? ORDER BY Watermark",
+                (cutoff,)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    edits_parser = commands.add_parser('edits', help='Saves and models per user and day.')
+    edits_parser.add_argument('activity_db')
+    edits_parser.add_argument('--since', help='First day to include, e.g. 2024-01-01.')
+    idle_parser = commands.add_parser('idle', help='Models not saved for a number of days.')
+    idle_parser.add_argument('activity_db')
+    idle_parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args(argv)
+
+    store = ModelActivityStore(args.activity_db)
+    try:
+        if args.command == 'edits':
+            for day, user, saves, models in store.edits_per_user_per_day(args.since):
+                print(f"{day}  {user or '-':<30}{saves:>6} saves{models:>5} models")
+        else:
+            for model_path, last_save in store.idle_models(args.days):
+                print(f"{last_save or 'never':<22}{model_path}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,36 @@
+import errno
+import functools
+import os
 import sqlite3
 import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing
 from datetime import datetime, timezone
 import logging
 from pathlib import Path, PurePath
 from dataclasses import dataclass
-from utils.gdrive import GoogleDriveAPI
+from utils.gdrive import GoogleDriveAPI, GoogleDriveClientPool, DEFAULT_CHUNK_SIZE, file_md5, is_not_found_error
+from utils.folder_cache import DriveFolderCache
+from utils.drive_index import DriveMetadataIndex
+from utils.rate_limiter import DriveRateLimiter
+from utils.bandwidth import BandwidthGovernor, BandwidthSchedule, bandwidth_report
+from utils.upload_manifest import UploadManifest
+from utils.upload_sessions import UploadSessionStore
+from utils.snapshot_store import SnapshotStore
+from utils.archive import SUFFIXES as ARCHIVE_SUFFIXES, compress_file, resolve_codec
+from backup_manager.pipeline import BackupPipeline, DiskBudget
+from backup_manager.summary import RunSummary
+from backup_manager.metrics import RunMetrics
+from backup_manager.model_state import ModelStateStore
+from backup_manager.activity import ModelActivityStore
+from backup_manager.work_queue import WorkQueue
+from backup_manager.run_journal import RunJournal
+from backup_manager.scheduler import BackupHistoryStore, BackupScheduler, window_deadline
+from backup_manager.watch import EditDebouncer, ExportRateLimiter
 import shutil
 import subprocess
+import threading
 import time
 
 @dataclass
@@ -18,6 +42,54 @@ class BackupConfig:
     rstoollocation: str
     temp_folder: str
     root_folder_id: str
+    export_workers: int = 1
+    upload_workers: int = 2
+    upload_queue_size: int = 2
+    folder_cache_path: str = 'state/drive_folders.db3'
+    skip_unchanged: bool = True
+    upload_manifest_path: str = 'state/upload_manifest.db3'
+    upload_chunk_size: int = DEFAULT_CHUNK_SIZE
+    upload_session_path: str = 'state/upload_sessions.db3'
+    model_state_path: str = 'state/model_state.db3'
+    scan_workers: int = 8
+    scan_busy_timeout: float = 2.0
+    temp_disk_budget: int = 0
+    report_path: str = 'logs/backup_report.json'
+    metrics_path: str = 'logs/revit_backup.prom'
+    snapshot_target: bool = False
+    snapshot_chunk_size: int = 1024 * 1024
+    watch_poll_interval: float = 60.0
+    watch_settle_seconds: float = 300.0
+    watch_max_delay: float = 3600.0
+    watch_max_exports_per_hour: int = 0
+    drive_requests_per_second: float = 10.0
+    drive_burst: int = 20
+    drive_max_retries: int = 6
+    activity_db_path: str = 'state/model_activity.db3'
+    work_queue_path: str = None
+    work_lease_seconds: float = 300.0
+    work_max_attempts: int = 3
+    history_path: str = 'state/backup_history.db3'
+    backup_window_end: str = None
+    backup_window_start: str = None
+    upload_mbit_per_second: float = 0
+    upload_bandwidth_schedule: list = None
+    run_journal_path: str = 'state/run_journal.db3'
+    archive_codec: str = None
+    archive_projects: list = None
+    archive_level: int = None
+    archive_threads: int = 0
+    archive_block_size: int = 16 * 1024 * 1024
+
+
+@dataclass
+class ExportedModel:
+    model_path: str
+    temp_path: Path
+    started: float
+    reserved_bytes: int = 0
+    export_seconds: float = 0.0
+    journaled: bool = False
 
 
 # noinspection SqlNoDataSourceInspection
@@ -38,7 +110,26 @@ class BackupManager:
         database location,
         server name,
         tool location,
-        temp folder.
+        temp folder,
+        export/upload worker counts,
+        Drive folder cache location,
+        unchanged-upload skipping and its manifest location,
+        upload chunk size and resumable session store location,
+        change-detection state location,
+        edit scan worker count and SQLite busy timeout,
+        temp-disk budget for exports in flight (bytes, 0 for no limit),
+        run report and Prometheus metrics file locations,
+        whether to also keep chunk-deduplicated snapshots in target, and their average chunk size,
+        watch mode poll interval, settle time and maximum delay (seconds) and export rate limit (0 for no limit),
+        Drive API request rate, burst and retries per call,
+        model activity analytics database location (None to not collect activity),
+        shared work queue location (None without a queue), lease length (seconds) and attempts per model,
+        backup duration history location and the local times the backup window ends ('HH:MM', None for no window)
+        and starts ('HH:MM', None to not defer runs started after the window),
+        upload bandwidth cap (Mbit/s, 0 for no limit) and its time-of-day windows,
+        run journal location (None to not journal runs),
+        archive codec for compressed uploads ('lzma' or 'zstd', None to upload exports as they are), the projects
+        (top-level folders) to compress (None for all), compression level, threads (0 for one per CPU) and block size.
         """
         # self.config = config
         self.source = Path(config.source)
@@ -48,67 +139,417 @@ class BackupManager:
         self.db_location = config.db_location
         self.servername = config.servername
         self.rstoollocation = config.rstoollocation
+        self.export_workers = config.export_workers
+        self.upload_workers = config.upload_workers
+        self.upload_queue_size = config.upload_queue_size
+        self.folder_cache = DriveFolderCache(config.folder_cache_path)
+        self.drive_index = DriveMetadataIndex()
+        self.metrics = RunMetrics()
+        self.report_path = config.report_path
+        self.metrics_path = config.metrics_path
+        self.drive_limiter = DriveRateLimiter(
+            config.drive_requests_per_second,
+            burst=config.drive_burst,
+            max_retries=config.drive_max_retries,
+            metrics=self.metrics
+        )
+        schedule = BandwidthSchedule.from_config(config.upload_mbit_per_second, config.upload_bandwidth_schedule)
+        self.bandwidth = BandwidthGovernor(schedule, metrics=self.metrics) if schedule else None
+        self.drive_pool = GoogleDriveClientPool(
+            'credentials.json', 'token.json',
+            folder_cache=self.folder_cache,
+            metadata_index=self.drive_index,
+            metrics=self.metrics,
+            rate_limiter=self.drive_limiter,
+            bandwidth=self.bandwidth
+        )
+        self.skip_unchanged = config.skip_unchanged
+        self.upload_manifest = UploadManifest(config.upload_manifest_path)
+        self.upload_chunk_size = config.upload_chunk_size
+        self.upload_sessions = UploadSessionStore(config.upload_session_path)
+        self.model_state = ModelStateStore(config.model_state_path)
+        self.activity_store = ModelActivityStore(config.activity_db_path) if config.activity_db_path else None
+        self.scan_workers = config.scan_workers
+        self.scan_busy_timeout = config.scan_busy_timeout
+        self.scan_times = {}
+        # Chunking holds the GIL, so snapshots are taken in worker processes, one per upload worker
+        self.snapshot_store = SnapshotStore(
+            self.target, config.snapshot_chunk_size,
+            executor=ProcessPoolExecutor(max_workers=max(1, config.upload_workers))
+        ) if config.snapshot_target else None
+        self._pending_snapshots = set()
+        self._snapshots_done = threading.Condition()
+        self.disk_budget = DiskBudget(config.temp_disk_budget)
+        self.export_estimates = {}
+        self.watch_poll_interval = config.watch_poll_interval
+        self.watch_settle_seconds = config.watch_settle_seconds
+        self.watch_max_delay = config.watch_max_delay
+        self.watch_max_exports_per_hour = config.watch_max_exports_per_hour
+        self.history = BackupHistoryStore(config.history_path)
+        self.scheduler = BackupScheduler(
+            self.history, self.model_state, self.activity_store,
+            export_workers=self.export_workers,
+            upload_workers=self.upload_workers
+        )
+        self.backup_window_end = config.backup_window_end
+        self.backup_window_start = config.backup_window_start
+        self.work_queue = WorkQueue(
+            config.work_queue_path,
+            lease_seconds=config.work_lease_seconds,
+            max_attempts=config.work_max_attempts
+        ) if config.work_queue_path else None
+        self.run_journal = RunJournal(config.run_journal_path) if config.run_journal_path else None
+        self.run_id = None
+        self.archive_codec = resolve_codec(config.archive_codec) if config.archive_codec else None
+        self.archive_projects = set(config.archive_projects) if config.archive_projects else None
+        self.archive_level = config.archive_level
+        self.archive_threads = config.archive_threads or os.cpu_count() or 1
+        self.archive_block_size = config.archive_block_size
+        self.archive_executor = ThreadPoolExecutor(
+            max_workers=self.archive_threads, thread_name_prefix='compress') if self.archive_codec else None
+        self.compression_stats = {}
+        self._compression_lock = threading.Lock()
+        self.summary = RunSummary()
+
+    def _start_run(self):
+        self.summary = RunSummary()
+        self.metrics.reset()
+        with self._compression_lock:
+            self.compression_stats = {}
+
+    def write_run_report(self, report_path=None, metrics_path=None):
+        """
+        Writes the last run's JSON report and Prometheus textfile metrics.
+
+        Parameters:
+        report_path (str): Where to write the JSON report. Defaults to the configured report_path.
+        metrics_path (str): Where to write the metrics file. Defaults to the configured metrics_path.
+        """
+        report_path = report_path or self.report_path
+        metrics_path = metrics_path or self.metrics_path
+        try:
+            bandwidth = bandwidth_report(self.metrics.counters())
+            extra = {'upload_bandwidth': bandwidth} if bandwidth else {}
+            compression = self._compression_report()
+            if compression:
+                extra['compression'] = compression
+            if report_path:
+                self.metrics.write_json(report_path, self.summary, extra)
+            if metrics_path:
+                self.metrics.write_prometheus(metrics_path, self.summary)
+            stages = ', '.join(
+                f"{stage} p50 {values['p50_seconds']}s/p95 {values['p95_seconds']}s"
+                for stage, values in self.metrics.stage_summary().items() if values['count'])
+            logging.info(f"Run report written. {stages}")
+            if bandwidth:
+                logging.info(f"Upload bandwidth while capped: {bandwidth['achieved_mbit_per_second']} Mbit/s achieved "
+                             f"of {bandwidth['allowed_mbit_per_second']} Mbit/s allowed over "
+                             f"{bandwidth['capped_seconds']} seconds, {bandwidth['wait_seconds']} seconds waiting")
+        except Exception as e:
+            logging.error(f"Error writing run report: {e}")
 
     def set_connection(self, db_path):
         return sqlite3.connect(db_path)
 
-    def backup_all_models(self):
+    def set_readonly_connection(self, db_path):
+        """
+        Opens a read-only connection with a short busy timeout, so scanning live
+        Revit Server data neither writes to it nor waits long on its locks.
+        """
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        return sqlite3.connect(uri, uri=True, timeout=self.scan_busy_timeout, check_same_thread=False)
+
+    def backup_all_models(self, run_id=None):
         """
         Backs up all models available in the database.
+
+        Parameters:
+        run_id (str): Optionally, the journal ID of the run. An existing run is resumed with its unfinished models.
         """
         logging.info("Backup process started for all models.")
+        self._start_run()
         try:
             with self.set_connection(self.db_location) as connection:
-                model_paths = self._get_all_paths(connection)
+                model_paths = self._journal_paths(run_id, 'all', lambda: self._get_all_paths(connection))
                 logging.info(f"Retrieved {len(model_paths)} model paths for backup.")
                 self._backup_selected_models(model_paths)
+            self._finish_journal()
         except sqlite3.Error as e:
             logging.error(f"Database error in backup process: {e}")
         except Exception as e:
             logging.error(f"Unexpected error in backup process: {e}")
         finally:
-            logging.info("Backup process finished.")
+            self.run_id = None
+            self.metrics.finish()
+            logging.info(f"Backup process finished. {self.summary}")
 
-    def backup_edited_models(self):
+    def backup_edited_models(self, run_id=None):
         """
-        Backs up models that were edited in the last 24 hours.
+        Backs up models that were edited since their last successful backup.
+
+        Parameters:
+        run_id (str): Optionally, the journal ID of the run. An existing run is resumed with its unfinished models.
         """
         logging.info("Backup process started for edited models.")
+        self._start_run()
         try:
             with self.set_connection(self.db_location) as connection:
-                model_paths = self._get_edited_paths(connection)
+                model_paths = self._journal_paths(run_id, 'edited', lambda: self._get_edited_paths(connection))
                 logging.info(f"Retrieved {len(model_paths)} edited model paths for backup.")
                 self._backup_selected_models(model_paths)
+            self._finish_journal()
         except sqlite3.Error as e:
             logging.error(f"Database error in backup process: {e}")
         except Exception as e:
             logging.error(f"Unexpected error in backup process: {e}")
         finally:
-            logging.info("Backup process finished.")
+            self.run_id = None
+            self.metrics.finish()
+            logging.info(f"Backup process finished. {self.summary}")
 
-    def backup_specific_model(self, specific_model):
+    def backup_specific_model(self, specific_model, run_id=None):
         """
         Backs up a specific model given its path.
 
         Parameters:
         specific_model (str): The path of the specific model to be backed up.
         Example: folder_name\\file_name.rvt
+        run_id (str): Optionally, the journal ID of the run. An existing run is resumed with its unfinished models.
         """
         logging.info(f"Backup process started for specific model: {specific_model}")
+        self._start_run()
         try:
             with self.set_connection(self.db_location) as connection:
-                model_paths = self._get_specific_path(connection, specific_model)
+                model_paths = self._journal_paths(
+                    run_id, 'specific', lambda: self._get_specific_path(connection, specific_model))
                 if model_paths:
                     logging.info(f"Starting backup for specific model: {model_paths[0]}")
                     self._backup_selected_models(model_paths)
                 else:
                     logging.warning(f"Specified model '{specific_model}' not found.")
+            self._finish_journal()
         except sqlite3.Error as e:
             logging.error(f"Database error retrieving specific model '{specific_model}': {e}")
         except Exception as e:
             logging.error(f"Unexpected error in backup process: {e}")
         finally:
-            logging.info("Backup process finished.")
+            self.run_id = None
+            self.metrics.finish()
+            logging.info(f"Backup process finished. {self.summary}")
+
+    def _journal_paths(self, run_id, kind, plan):
+        """
+        Starts the run's journal. Resuming a journaled run returns its models that are not
+        verified yet; otherwise the models returned by plan are journaled as a new run.
+
+        Parameters:
+        run_id (str): The journal ID of the run. Only a given ID resumes a run; by default a new run
+            gets a unique ID from the current time and a random suffix.
+        kind (str): The kind of run, recorded in the journal. A journaled run of another kind is not resumed.
+        plan (callable): Returns the model paths of a new run.
+
+        Returns:
+        list: The model paths to back up.
+
+        Raises:
+        ValueError: If run_id is a journaled run of another kind.
+        """
+        if self.run_journal is None:
+            return plan()
+        run_id = run_id or f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        journaled_kind = self.run_journal.run_kind(run_id)
+        if journaled_kind is not None and journaled_kind != kind:
+            raise ValueError(f"Run '{run_id}' was journaled as kind '{journaled_kind}', not '{kind}'; it is not resumed")
+        if journaled_kind is not None:
+            model_paths = self.run_journal.unfinished(run_id)
+            logging.info(f"Resuming run '{run_id}' with {len(model_paths)} unfinished models "
+                         f"(journal: {self.run_journal.counts(run_id)}).")
+        else:
+            self.run_journal.prune()
+            model_paths = plan()
+            self.run_journal.plan(run_id, kind, model_paths)
+            logging.info(f"Journaling run '{run_id}'. If it is interrupted, resume it with --run-id {run_id}")
+        self.run_id = run_id
+        return model_paths
+
+    def _finish_journal(self):
+        if self.run_id is not None:
+            self.run_journal.finish(self.run_id)
+            logging.info(f"Run '{self.run_id}' finished (journal: {self.run_journal.counts(self.run_id)}).")
+
+    def _journal_state(self, model_path, state, error=None):
+        """
+        Records a model's progress in the journal of the current run. Journal errors are logged,
+        they never fail a backup.
+        """
+        if self.run_id is None:
+            return
+        try:
+            self.run_journal.set_state(self.run_id, model_path, state, error)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not journal state '{state}' of model '{model_path}': {e}")
+
+    def watch_edited_models(self, stop_event=None):
+        """
+        Keeps running and backs up edited models shortly after their saves settle.
+
+        Every watch_poll_interval the models are scanned as in backup_edited_models, which costs
+        one stat per unchanged model. An edited model is backed up once its history watermark
+        has been stable for watch_settle_seconds, or watch_max_delay after it was first seen
+        edited, and at most watch_max_exports_per_hour exports start in any hour.
+
+        Parameters:
+        stop_event (threading.Event): Optionally, stops watching once set. Otherwise runs until interrupted.
+        """
+        stop_event = stop_event or threading.Event()
+        debouncer = EditDebouncer(self.watch_settle_seconds, self.watch_max_delay)
+        rate_limiter = ExportRateLimiter(self.watch_max_exports_per_hour, 3600)
+        logging.info(f"Watching for edited models every {self.watch_poll_interval} seconds.")
+        try:
+            while not stop_event.is_set():
+                self._watch_cycle(debouncer, rate_limiter)
+                stop_event.wait(self.watch_poll_interval)
+        except KeyboardInterrupt:
+            pass
+        logging.info("Stopped watching for edited models.")
+
+    def _watch_cycle(self, debouncer, rate_limiter):
+        """
+        Runs one scan of the watch loop and backs up the models that are ready and allowed.
+
+        Parameters:
+        debouncer (EditDebouncer): Tracks edited models across scans.
+        rate_limiter (ExportRateLimiter): Caps the exports started per hour.
+        """
+        self._start_run()
+        try:
+            with self.set_connection(self.db_location) as connection:
+                edited_paths = self._get_edited_paths(connection)
+            watermarks = {}
+            for model_path in edited_paths:
+                state = self.model_state.get(model_path)
+                watermarks[model_path] = state.scanned_watermark if state else None
+            ready = debouncer.update(watermarks)
+            allowed = rate_limiter.available()
+            if len(ready) > allowed:
+                logging.debug(f"{len(ready)} edited models are ready, the export rate limit allows {allowed} now.")
+                ready = ready[:allowed]
+            if not ready:
+                return
+            logging.info(f"Backup process started for {len(ready)} settled edited models "
+                         f"({len(debouncer) - len(ready)} still waiting).")
+            rate_limiter.record(len(ready))
+            try:
+                self._backup_selected_models(ready)
+            finally:
+                debouncer.defer(ready)
+                self.metrics.finish()
+                logging.info(f"Backup process finished. {self.summary}")
+            self.write_run_report()
+        except sqlite3.Error as e:
+            logging.error(f"Database error in watch cycle: {e}")
+        except Exception as e:
+            logging.error(f"Unexpected error in watch cycle: {e}")
+
+    def enqueue_models(self, all_models=False):
+        """
+        Planner of a distributed run: adds the edited (or all) models to the shared work queue
+        with their scheduler priority and predicted duration, for any number of
+        backup_queued_models workers to process highest priority first within the backup window.
+        Models that workers finished since the last planning are first recorded as backed up.
+
+        Parameters:
+        all_models (bool): Enqueue every model instead of only the edited ones.
+        """
+        logging.info(f"Planning queued backup of {'all' if all_models else 'edited'} models.")
+        try:
+            finished = self.work_queue.take_done(self.servername)
+            for model_path, watermark in finished:
+                self.model_state.mark_backed_up(model_path, watermark)
+            with self.set_connection(self.db_location) as connection:
+                model_paths = self._get_all_paths(connection) if all_models else self._get_edited_paths(connection)
+            self._estimate_export_sizes(model_paths)
+            scheduled, _ = self.scheduler.schedule(model_paths, self.export_estimates)
+            items = []
+            for model in scheduled:
+                state = self.model_state.get(model.model_path)
+                items.append((model.model_path, state.scanned_watermark if state else None, model.priority,
+                              self.export_estimates[model.model_path],
+                              model.cost.export_seconds + model.cost.upload_seconds))
+            added = self.work_queue.enqueue(items, self.servername)
+            logging.info(f"Recorded {len(finished)} finished models, enqueued {added} of {len(model_paths)} models. "
+                         f"Queue: {self.work_queue.counts(self.servername)}")
+        except sqlite3.Error as e:
+            logging.error(f"Database error planning queued backup: {e}")
+        except Exception as e:
+            logging.error(f"Unexpected error planning queued backup: {e}")
+
+    def backup_queued_models(self):
+        """
+        Worker of a distributed run: claims models from the shared work queue one at a time,
+        highest priority first, and backs them up through the export/upload pipeline until
+        the queue is empty. With a backup window, only models predicted to finish before it
+        ends are claimed; the others stay queued for the next run.
+        Leases are extended while the worker runs; models of a worker that stops are
+        claimed by others once their lease expires.
+        """
+        logging.info(f"Backup process started for queued models as worker '{self.work_queue.worker_id}'.")
+        self._start_run()
+        claimed = {}
+        deadline = self._window_deadline()
+
+        def claim_models():
+            while True:
+                item = self.work_queue.claim(self.servername, deadline)
+                if item is None:
+                    return
+                claimed[item.model_path] = item
+                self.export_estimates[item.model_path] = item.size_estimate
+                yield item.model_path
+
+        def export_stage(model_path):
+            exported = self._export_model(model_path)
+            if exported is None:
+                self.work_queue.complete(claimed.pop(model_path), False, 'export failed')
+            return exported
+
+        def upload_stage(exported):
+            def finished(succeeded):
+                self.work_queue.complete(
+                    claimed.pop(exported.model_path), succeeded, None if succeeded else 'upload failed')
+            self._upload_model(exported, on_finished=finished)
+
+        try:
+            pending = self.work_queue.pending_paths(self.servername)
+            if pending:
+                self._warm_folder_cache()
+                self._prefetch_drive_metadata(pending)
+            pipeline = BackupPipeline(
+                export_stage,
+                upload_stage,
+                export_workers=self.export_workers,
+                upload_workers=self.upload_workers,
+                queue_size=self.upload_queue_size
+            )
+            with self.work_queue.keep_alive():
+                try:
+                    pipeline.run(claim_models())
+                finally:
+                    self._wait_for_snapshots()
+            left = self.work_queue.counts(self.servername).get(WorkQueue.PENDING, 0)
+            if deadline and left:
+                logging.info(
+                    f"Left {left} queued models predicted not to fit the backup window ending "
+                    f"{datetime.fromtimestamp(deadline):%Y-%m-%d %H:%M} for the next run.")
+        except sqlite3.Error as e:
+            logging.error(f"Database error in queued backup: {e}")
+        except Exception as e:
+            logging.error(f"Unexpected error in queued backup: {e}")
+        finally:
+            for item in claimed.values():
+                self.work_queue.complete(item, False, 'worker stopped')
+            self.metrics.finish()
+            logging.info(f"Backup process finished. {self.summary}")
 
     def _get_all_paths(self, connection):
         """
@@ -129,26 +570,43 @@ class BackupManager:
 
     def _get_edited_paths(self, connection):
         """
-        Retrieves model paths that were edited in the last 24 hours.
+        Retrieves model paths that were edited since their last successful backup.
 
         Parameters:
         connection (sqlite3.Connection): The SQLite database connection.
 
         Returns:
-        list: A list of model paths edited in the last 24 hours.
+        list: A list of model paths with unsaved history.
         """
         model_paths = self._get_all_paths(connection)
-        # return [model_path for model_path in model_paths if self._was_edited_in_last_24_hours(model_path)]
-        edited_paths = []
-        for model_path in model_paths:
-            try:
-                if self._was_edited_in_last_24_hours(model_path):
-                    edited_paths.append(model_path)
-            except Exception as e:
-                logging.error(f"Error checking edit status for model '{model_path}': {e}")
-                continue  # Skip this model, continue with others
+        self.scan_times = {}
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=max(1, self.scan_workers), thread_name_prefix='scan') as executor:
+            results = list(executor.map(self._timed_is_model_changed, model_paths))
+        edited_paths = [model_path for model_path, edited in zip(model_paths, results) if edited]
+        if self.scan_times:
+            slowest = max(self.scan_times, key=self.scan_times.get)
+            logging.info(
+                f"Scanned {len(model_paths)} models in {time.time() - start_time:.2f} seconds "
+                f"(slowest: '{slowest}' in {self.scan_times[slowest]:.3f} seconds)")
         return edited_paths
 
+    def _timed_is_model_changed(self, model_path):
+        """
+        Scan worker: runs _is_model_changed and records how long the model took.
+        """
+        start_time = time.perf_counter()
+        try:
+            return self._is_model_changed(model_path)
+        except Exception as e:
+            logging.error(f"Error checking edit status for model '{model_path}': {e}")
+            return False  # Skip this model, continue with others
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.scan_times[model_path] = elapsed
+            self.metrics.record('scan', elapsed)
+            logging.debug(f"Scanned model '{model_path}' in {elapsed:.3f} seconds")
+
     def _get_specific_path(self, connection, specific_model):
         """
         Retrieves the path for a specific model.
@@ -171,60 +629,575 @@ class BackupManager:
             logging.error(f"Database error retrieving specific model '{specific_model}': {e}")
             return []
 
-    def _was_edited_in_last_24_hours(self, model_path):
+    def _is_model_changed(self, model_path):
         """
-        Checks if a model was edited in the last 24 hours.
+        Checks if a model's history watermark (ModelHistory MAX(Time)) moved since its last successful backup.
+        Models whose Model.db3 size and mtime did not change since the last scan are decided without opening SQLite.
+        The first time a model is seen it is selected only if it was edited in the last 24 hours.
+        While Model.db3 is open, its new ModelHistory rows are also copied to the activity store.
 
         Parameters:
         model_path (str): The path of the model to be checked.
-        connection (sqlite3.Connection): The SQLite database connection.
 
         Returns:
-        bool: True if the model was edited in the last 24 hours, False otherwise.
+        bool: True if the model needs a backup, False otherwise.
         """
+        full_model_path = self._get_full_model_path(model_path)
         try:
-            with self.set_connection(self._get_full_model_path(model_path)) as connection:
-                last_edit_datetime = self._get_last_edit_datetime(self._get_full_model_path(model_path), connection)
+            stat = full_model_path.stat()
+            state = self.model_state.get(model_path)
+            if (state and state.db_size == stat.st_size and state.db_mtime_ns == stat.st_mtime_ns
+                    and (self.activity_store is None or self.activity_store.has_model(model_path))):
+                return state.scanned_watermark != state.backed_up_watermark
+            with closing(self.set_readonly_connection(full_model_path)) as connection:
+                last_edit_datetime = self._get_last_edit_datetime(full_model_path, connection)
+                self._ingest_activity(model_path, connection)
+            watermark = last_edit_datetime.strftime(self.DATETIME_FORMAT)
+            if state is None:
                 now_date_utc = datetime.now().astimezone(timezone.utc).replace(tzinfo=None)
-                return (now_date_utc - last_edit_datetime).total_seconds() < 86400  # 24 hours
+                edited = (now_date_utc - last_edit_datetime).total_seconds() < 86400  # 24 hours
+                self.model_state.record_scan(
+                    model_path, stat.st_size, stat.st_mtime_ns, watermark, baseline=not edited)
+                return edited
+            self.model_state.record_scan(model_path, stat.st_size, stat.st_mtime_ns, watermark)
+            return watermark != state.backed_up_watermark
         except sqlite3.Error as e:
-            logging.error(f"Database error determining if model '{model_path}' was edited in the last 24 hours: {e}")
+            logging.error(f"Database error determining if model '{model_path}' was edited: {e}")
             return False
         except Exception as e:
-            logging.error(f"Unexpected error determining if model '{model_path}' was edited in the last 24 hours: {e}")
+            logging.error(f"Unexpected error determining if model '{model_path}' was edited: {e}")
             return False
 
+    def _ingest_activity(self, model_path, connection):
+        """
+        Copies the model's new ModelHistory rows to the activity store. Errors are logged,
+        they never affect edit detection.
+
+        Parameters:
+        model_path (str): The path of the model being scanned.
+        connection (sqlite3.Connection): The scan's open connection to the model's Model.db3.
+        """
+        if self.activity_store is None:
+            return
+        try:
+            rows = self.activity_store.ingest(model_path, connection)
+            if rows:
+                self.metrics.count('activity_rows', rows)
+                logging.debug(f"Ingested {rows} history rows of model '{model_path}'")
+        except sqlite3.Error as e:
+            logging.warning(f"Could not ingest activity of model '{model_path}': {e}")
+
     def _backup_selected_models(self, model_paths):
-        for model_path in model_paths:
+        """
+        Backs up the given models through the export/upload pipeline.
+
+        Parameters:
+        model_paths (list): The paths of the models to be backed up.
+        """
+        if model_paths:
+            self._warm_folder_cache()
+            self._prefetch_drive_metadata(model_paths)
+        self._estimate_export_sizes(model_paths)
+        model_paths = self._schedule(model_paths)
+        pipeline = BackupPipeline(
+            self._export_model,
+            self._upload_model,
+            export_workers=self.export_workers,
+            upload_workers=self.upload_workers,
+            queue_size=self.upload_queue_size
+        )
+        try:
+            pipeline.run(model_paths)
+        finally:
+            self._wait_for_snapshots()
+
+    def _estimate_export_sizes(self, model_paths):
+        """
+        Estimates every model's export size, for the disk budget and the scheduler.
+
+        Parameters:
+        model_paths (list): The paths of the models to be backed up.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, self.scan_workers), thread_name_prefix='estimate') as executor:
+            self.export_estimates = dict(zip(model_paths, executor.map(self._estimate_export_size, model_paths)))
+
+    def _schedule(self, model_paths):
+        """
+        Orders the models by priority (recent saves, time since the last backup, size) and,
+        with a backup window, defers the models predicted not to fit before it ends.
+        While the run is in progress, a model whose predicted cost no longer fits is deferred too.
+
+        Parameters:
+        model_paths (list): The paths of the models to be backed up.
+
+        Returns:
+        iterable: The model paths to back up, highest priority first.
+        """
+        deadline = self._window_deadline()
+        admitted, deferred = self.scheduler.schedule(model_paths, self.export_estimates, deadline)
+        for model in deferred:
+            self.summary.add('deferred')
+        if deferred:
+            logging.info(
+                f"Deferred {len(deferred)} models predicted not to fit the backup window ending "
+                f"{datetime.fromtimestamp(deadline):%Y-%m-%d %H:%M}: "
+                f"{', '.join(model.model_path for model in deferred[:10])}{', ...' if len(deferred) > 10 else ''}")
+
+        def admitted_paths():
+            for model in admitted:
+                predicted = model.cost.export_seconds + model.cost.upload_seconds
+                if deadline and time.time() + predicted > deadline:
+                    logging.info(f"Deferred '{model.model_path}': its predicted {predicted:.0f} seconds "
+                                 f"no longer fit the backup window")
+                    self.summary.add('deferred')
+                    continue
+                yield model.model_path
+
+        return admitted_paths()
+
+    def _window_deadline(self):
+        """
+        Returns:
+        float: The timestamp the current run must finish by, None without a backup window. A resumed
+        run keeps the window it was started in, and a run started outside the window gets no time at all.
+        """
+        if not self.backup_window_end:
+            return None
+        started = None
+        if self.run_id is not None:
             try:
-                self._perform_backup_for_model(model_path)
-            except Exception as e:
-                logging.error(f"Error during backup for model '{model_path}': {e}")
+                started = self.run_journal.started_at(self.run_id)
+            except sqlite3.Error as e:
+                logging.warning(f"Could not read the start of run '{self.run_id}' from the journal: {e}")
+        return window_deadline(self.backup_window_end, self.backup_window_start, started)
+
+    def _estimate_export_size(self, model_path):
+        """
+        Estimates a model's export size from the on-disk size of its Revit Server folder.
+
+        Parameters:
+        model_path (str): The path of the model.
+
+        Returns:
+        int: The estimated size in bytes, 0 if the folder cannot be read.
+        """
+        total = 0
+        pending = [self.source / model_path]
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+            except OSError as e:
+                logging.warning(f"Could not estimate export size for model '{model_path}': {e}")
+        return total
+
+    def _warm_folder_cache(self):
+        """
+        Loads the backup root's folder tree into an empty folder cache with a single bulk listing.
+        """
+        if self.folder_cache.has_root(self.root_folder_id):
+            return
+        try:
+            count = self.drive_pool.get().warm_folder_cache(self.root_folder_id)
+            logging.info(f"Warmed Google Drive folder cache with {count} folders.")
+        except Exception as e:
+            logging.warning(f"Could not warm Google Drive folder cache: {e}")
+
+    def _prefetch_drive_metadata(self, model_paths):
+        """
+        Resolves every existing target folder once and lists all their children into the
+        metadata index in a few batched requests, so per-model find_file and folder checks
+        are answered from memory during the run. Missing folders are not created here but
+        when a model is uploaded to them, so models that fail or are deferred leave none behind.
+
+        Parameters:
+        model_paths (list): The paths of the models about to be backed up.
+        """
+        self.drive_index.clear()
+        try:
+            drive_api = self.drive_pool.get()
+            folder_paths = sorted({str(PurePath(model_path).parent) for model_path in model_paths})
+            folder_ids = [folder_id for folder_id in (drive_api.find_folder(folder_path, self.root_folder_id)
+                                                      for folder_path in folder_paths) if folder_id]
+            count = drive_api.prefetch_children(folder_ids)
+            logging.info(f"Prefetched metadata of {count} Google Drive items in {len(folder_ids)} folders.")
+        except Exception as e:
+            logging.warning(f"Could not prefetch Google Drive metadata: {e}")
 
     def _perform_backup_for_model(self, model_path):
         """
-        Performs the backup for a specific model.
+        Performs the backup for a specific model without the pipeline.
 
         Parameters:
         model_path (str): The path of the model to be backed up.
         """
+        exported = self._export_model(model_path)
+        if exported is not None:
+            self._upload_model(exported)
+            self._wait_for_snapshots()
+
+    def _export_model(self, model_path):
+        """
+        Export stage: creates the temporary Revit file for a model.
+
+        Parameters:
+        model_path (str): The path of the model to be backed up.
+
+        Returns:
+        ExportedModel: The exported model, or None if the export failed.
+        """
+        estimate = self.export_estimates.get(model_path, 0)
+        if self._is_archived(model_path):
+            # The archive is written next to the export and is at most about as large
+            estimate *= 2
+        self.disk_budget.acquire(estimate)
         logging.info(f"Starting backup for model: {model_path}")
         start_time = time.time()
         temp_path = self.temp_folder / model_path
-        target_path = self.target / model_path
         try:
-            self._create_temp_rvt(model_path, temp_path, self.rstoollocation, self.servername)
-            # self._copy_to_target(model_path, temp_path, target_path)
-            self._upload_file_to_gdrive(temp_path, self.root_folder_id, model_path)
-            self._verify_backup(model_path, target_path)
-            self._clean_temp_folder(self.temp_folder)
-            logging.info(f"Backup completed for model: {model_path} in {time.time() - start_time:.2f} seconds")
-        except FileNotFoundError as e:
-            logging.error(f"File not found during backup operations for '{model_path}': {e}")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Subprocess error during backup operations for '{model_path}': {e}")
+            source_stat, journaled = self._journaled_export(model_path, temp_path)
+            if journaled is not None:
+                logging.info(f"Reusing the journaled temp export of model '{model_path}'")
+                self.metrics.count('exports_reused')
+                return ExportedModel(model_path, temp_path, start_time, estimate, journaled.export_seconds,
+                                     self._record_export(model_path, temp_path, source_stat, journaled.export_seconds))
+            try:
+                with self.metrics.stage('export') as sample:
+                    self._create_temp_rvt(model_path, temp_path, self.rstoollocation, self.servername)
+                    sample['bytes'] = temp_path.stat().st_size if temp_path.is_file() else 0
+            except Exception as e:
+                if not self._is_disk_full(e, estimate):
+                    raise
+                # Free the partial export, let the exports in flight drain, then retry alone
+                logging.warning(f"Temp disk full while exporting '{model_path}', retrying once the disk drains")
+                self._clean_temp_model(temp_path)
+                self.disk_budget.wait_until_alone(estimate)
+                self._create_temp_rvt(model_path, temp_path, self.rstoollocation, self.servername)
+            export_seconds = time.time() - start_time
+            return ExportedModel(model_path, temp_path, start_time, estimate, export_seconds,
+                                 self._record_export(model_path, temp_path, source_stat, export_seconds))
         except Exception as e:
-            logging.error(f"Unexpected error during backup operations for '{model_path}': {e}")
+            self._log_backup_error(model_path, e)
+            self.summary.add('failed')
+            self._journal_state(model_path, RunJournal.FAILED, str(e))
+            self._clean_temp_model(temp_path)
+            self.disk_budget.release(estimate)
+            return None
+
+    def _journaled_export(self, model_path, temp_path):
+        """
+        Looks up the journal of the current run for an export of the model that can be reused.
+        Journal errors, and a Model.db3 that cannot be read, are logged; the model is then
+        exported without reusing or journaling the export.
+
+        Returns:
+        tuple: (source_stat, journaled) - the stat of the model's Model.db3 to journal the export
+        with, or None to not journal it, and the reusable JournaledExport, or None.
+        """
+        if self.run_id is None:
+            return None, None
+        try:
+            source_stat = self._get_full_model_path(model_path).stat()
+            return source_stat, self.run_journal.reusable_export(model_path, temp_path, source_stat)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Could not check the journal for an export of model '{model_path}': {e}")
+            return None, None
+
+    def _record_export(self, model_path, temp_path, source_stat, export_seconds):
+        """
+        Journals a model's export in the current run, so it can be reused if its upload does not complete.
+
+        Returns:
+        bool: True if the export was journaled.
+        """
+        if source_stat is None:
+            return False
+        try:
+            self.run_journal.record_export(self.run_id, model_path, temp_path, source_stat, export_seconds)
+            return True
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Could not journal the export of model '{model_path}': {e}")
+            return False
+
+    def _upload_model(self, exported, on_finished=None):
+        """
+        Upload stage: uploads (verified against Drive's checksum) and cleans up an exported model.
+        A journaled export whose upload fails is kept, so the next run uploads it again and
+        resumes the saved upload session instead of exporting and uploading from byte zero.
+        With a snapshot store, the snapshot is taken in a worker process while the upload worker
+        moves on; the model is finished once its snapshot is stored.
+
+        Parameters:
+        exported (ExportedModel): The model produced by the export stage.
+        on_finished (callable): Optionally, called once the model is finished, with True if it was
+            backed up or found unchanged and False if it failed.
+        """
+        model_path = exported.model_path
+        upload_started = time.time()
+        archive_path = None
+        snapshot_started = False
+        succeeded = False
+        try:
+            # self._copy_to_target(model_path, exported.temp_path, self.target / model_path)
+            upload_path, drive_path, app_properties = exported.temp_path, model_path, None
+            archive_unchanged = False
+            if self._is_archived(model_path):
+                suffix = ARCHIVE_SUFFIXES[self.archive_codec]
+                drive_path = model_path + suffix
+                archive_unchanged = self.skip_unchanged and self._is_archive_unchanged(drive_path, exported.temp_path)
+                if not archive_unchanged:
+                    archive_path = exported.temp_path.with_name(exported.temp_path.name + suffix)
+                    archived = self._archive_export(model_path, exported.temp_path, archive_path)
+                    upload_path, app_properties = archive_path, archived.app_properties()
+            if archive_unchanged:
+                uploaded = False
+            else:
+                uploaded = self._upload_file_to_gdrive(
+                    upload_path, self.root_folder_id, drive_path,
+                    drive_api=self.drive_pool.get(),
+                    manifest=self.upload_manifest,
+                    skip_unchanged=self.skip_unchanged,
+                    chunk_size=self.upload_chunk_size,
+                    session_store=self.upload_sessions,
+                    app_properties=app_properties
+                )
+            self._journal_state(model_path, RunJournal.UPLOADED)
+            upload_seconds = time.time() - upload_started if uploaded else None
+            if self.snapshot_store is not None:
+                self._start_snapshot(exported, uploaded, upload_seconds, on_finished)
+                snapshot_started = True
+                return
+            self._finish_backup(exported, uploaded, upload_seconds)
+            succeeded = True
+        except Exception as e:
+            self._fail_backup(exported, e)
+        finally:
+            if archive_path is not None and archive_path.exists():
+                with self.metrics.stage('cleanup'):
+                    self._clean_temp_folder(archive_path)
+            if not snapshot_started:
+                self._release_export(exported, keep=not succeeded and exported.journaled)
+        if on_finished is not None:
+            on_finished(succeeded)
+
+    def _finish_backup(self, exported, uploaded, upload_seconds):
+        """
+        Records a model whose upload (and snapshot) completed as backed up.
+
+        Parameters:
+        exported (ExportedModel): The model produced by the export stage.
+        uploaded (bool): Whether it was uploaded, as opposed to skipped as unchanged.
+        upload_seconds (float): How long the upload took, None if it was skipped.
+        """
+        model_path = exported.model_path
+        self.model_state.mark_backed_up(model_path)
+        self.history.record(model_path, exported.export_seconds, upload_seconds, exported.temp_path.stat().st_size)
+        self._journal_state(model_path, RunJournal.VERIFIED)
+        self.summary.add('uploaded' if uploaded else 'skipped_unchanged')
+        logging.info(f"Backup completed for model: {model_path} in {time.time() - exported.started:.2f} seconds")
+
+    def _fail_backup(self, exported, error):
+        self._log_backup_error(exported.model_path, error)
+        self.summary.add('failed')
+        state = RunJournal.EXPORTED if exported.journaled else RunJournal.FAILED
+        self._journal_state(exported.model_path, state, str(error))
+
+    def _release_export(self, exported, keep=False):
+        """
+        Removes a finished model's temp export, or keeps it for the next run, and frees its disk reservation.
+        """
+        with self.metrics.stage('cleanup'):
+            if keep:
+                logging.info(f"Kept the temp export of model '{exported.model_path}' for the next run")
+            else:
+                self._clean_temp_model(exported.temp_path)
+        self.disk_budget.release(exported.reserved_bytes)
+
+    def _start_snapshot(self, exported, uploaded, upload_seconds, on_finished):
+        """
+        Submits the export to the snapshot store's process pool. The model is finished,
+        and its export released, when the snapshot is stored.
+        """
+        future = self.snapshot_store.submit(exported.temp_path, exported.model_path)
+        with self._snapshots_done:
+            self._pending_snapshots.add(future)
+        future.add_done_callback(functools.partial(
+            self._snapshot_done, exported, uploaded, upload_seconds, on_finished, time.time()))
+
+    def _snapshot_done(self, exported, uploaded, upload_seconds, on_finished, started, future):
+        model_path = exported.model_path
+        succeeded = False
+        try:
+            result = future.result()
+            self.metrics.record('snapshot', time.time() - started, result['size'])
+            if result['snapshot']:
+                logging.info(
+                    f"Stored snapshot {result['snapshot']} of '{model_path}' in target: {result['new_chunks']} "
+                    f"of {result['chunks']} chunks new, {result['new_bytes'] / 1048576:.1f} MB written")
+            else:
+                logging.info(f"Snapshot of '{model_path}' unchanged, no new version stored in target")
+            self._finish_backup(exported, uploaded, upload_seconds)
+            succeeded = True
+        except Exception as e:
+            self._fail_backup(exported, e)
+        finally:
+            self._release_export(exported, keep=not succeeded and exported.journaled)
+            with self._snapshots_done:
+                self._pending_snapshots.discard(future)
+                self._snapshots_done.notify_all()
+        if on_finished is not None:
+            on_finished(succeeded)
+
+    def _wait_for_snapshots(self):
+        """
+        Waits until the snapshots still being stored are done, so their models are finished.
+        """
+        with self._snapshots_done:
+            while self._pending_snapshots:
+                self._snapshots_done.wait()
+
+    def _is_archived(self, model_path):
+        """
+        Checks whether a model is uploaded as a compressed archive: archival is enabled and,
+        with archive_projects, the model's project (top-level folder) is one of them.
+        """
+        if self.archive_codec is None:
+            return False
+        return self.archive_projects is None or PurePath(model_path).parts[0] in self.archive_projects
+
+    def _is_archive_unchanged(self, drive_path, temp_path):
+        """
+        Checks whether the archive in Drive was made from identical content, by comparing the export's
+        size and MD5 with the original's recorded in the archive's appProperties, so an unchanged
+        export is not compressed only to match the previous archive. The appProperties are only
+        trusted while the archive's md5Checksum in Drive is the one last verified in the upload
+        manifest, since they are written in the same update as the media.
+
+        Parameters:
+        drive_path (str): The archive's path in Drive below the backup root.
+        temp_path (Path): The temporary path of the export.
+
+        Returns:
+        bool: True if the archive in Drive holds the export's content.
+        """
+        try:
+            drive_api = self.drive_pool.get()
+            rel_path = PurePath(drive_path)
+            folder_id = drive_api.find_folder(str(rel_path.parent), self.root_folder_id)
+            existing = drive_api.find_file(rel_path.name, folder_id) if folder_id else None
+            verified = self.upload_manifest.get(self.root_folder_id, drive_path)
+            if existing is None or verified is None:
+                return False
+            if (existing['id'], existing.get('md5Checksum')) != (verified['id'], verified['md5Checksum']):
+                return False
+            properties = existing.get('appProperties') or {}
+            if properties.get('originalSize') != str(temp_path.stat().st_size):
+                return False
+            if properties.get('originalMd5') != file_md5(temp_path):
+                return False
+        except Exception as e:
+            logging.warning(f"Could not compare '{drive_path}' with its export, compressing it: {e}")
+            return False
+        logging.info(f"Skipped unchanged '{drive_path}' (export matches the archived original's MD5)")
+        return True
+
+    def _archive_export(self, model_path, temp_path, archive_path):
+        """
+        Compresses the export into an archive next to it while reading it once, and records
+        the compression ratio and CPU time per model and project.
+
+        Parameters:
+        model_path (str): The path of the model being backed up.
+        temp_path (Path): The temporary path of the export.
+        archive_path (Path): Where to write the archive.
+
+        Returns:
+        ArchiveResult: The archive's sizes, the export's MD5 and the CPU time spent.
+        """
+        with self.metrics.stage('compress', temp_path.stat().st_size):
+            result = compress_file(temp_path, archive_path, self.archive_codec, self.archive_level,
+                                   self.archive_block_size, self.archive_threads, self.archive_executor)
+        # The archive of a kept export gets the same size and mtime again, so its saved upload session resumes
+        export_stat = temp_path.stat()
+        os.utime(archive_path, ns=(export_stat.st_atime_ns, export_stat.st_mtime_ns))
+        self.metrics.count('archive_original_bytes', result.original_size)
+        self.metrics.count('archive_compressed_bytes', result.compressed_size)
+        self.metrics.count('archive_cpu_seconds', result.cpu_seconds)
+        project = PurePath(model_path).parts[0]
+        with self._compression_lock:
+            stats = self.compression_stats.setdefault(
+                project, {'models': 0, 'original_bytes': 0, 'compressed_bytes': 0, 'cpu_seconds': 0.0})
+            stats['models'] += 1
+            stats['original_bytes'] += result.original_size
+            stats['compressed_bytes'] += result.compressed_size
+            stats['cpu_seconds'] += result.cpu_seconds
+        logging.info(
+            f"Compressed '{model_path}' with {result.codec}: {result.original_size / 1048576:.1f} MB to "
+            f"{result.compressed_size / 1048576:.1f} MB (ratio {result.ratio:.2f}) in {result.cpu_seconds:.1f} CPU seconds")
+        return result
+
+    def _compression_report(self):
+        """
+        Returns:
+        dict: Per project compressed in the last run: models, bytes before and after, ratio and CPU seconds per GB.
+        """
+        with self._compression_lock:
+            stats = {project: dict(values) for project, values in self.compression_stats.items()}
+        for values in stats.values():
+            values['ratio'] = round(values['original_bytes'] / values['compressed_bytes'], 3) \
+                if values['compressed_bytes'] else 0.0
+            values['cpu_seconds_per_gb'] = round(values['cpu_seconds'] / (values['original_bytes'] / 1024 ** 3), 3) \
+                if values['original_bytes'] else 0.0
+            values['cpu_seconds'] = round(values['cpu_seconds'], 3)
+        return stats
+
+    def _is_disk_full(self, error, estimate):
+        """
+        Checks whether an export failed because the temp disk ran out of space.
+
+        Parameters:
+        error (Exception): The error raised by the export.
+        estimate (int): The estimated export size in bytes.
+
+        Returns:
+        bool: True if the disk is full or has less free space than the export needs.
+        """
+        if isinstance(error, OSError) and (error.errno == errno.ENOSPC or getattr(error, 'winerror', None) == 112):
+            return True
+        try:
+            existing = next(path for path in [self.temp_folder, *self.temp_folder.parents] if path.exists())
+            return shutil.disk_usage(existing).free < estimate
+        except (StopIteration, OSError):
+            return False
+
+    def _clean_temp_model(self, temp_path):
+        """
+        Removes one model's temp export and any folders it leaves empty below the temp folder.
+
+        Parameters:
+        temp_path (Path): The temporary path of the model's export.
+        """
+        self._clean_temp_folder(temp_path)
+        parent = temp_path.parent
+        while parent != self.temp_folder and self.temp_folder in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break  # Not empty: another export still uses it
+            parent = parent.parent
+
+    @staticmethod
+    def _log_backup_error(model_path, error):
+        if isinstance(error, FileNotFoundError):
+            logging.error(f"File not found during backup operations for '{model_path}': {error}")
+        elif isinstance(error, subprocess.CalledProcessError):
+            logging.error(f"Subprocess error during backup operations for '{model_path}': {error}")
+        else:
+            logging.error(f"Unexpected error during backup operations for '{model_path}': {error}")
 
     def _get_full_model_path(self, model_path):
         """
@@ -278,15 +1251,21 @@ class BackupManager:
         servername (str): The name of the Revit server.
 
         Raises:
+        RuntimeError: If RevitServerTool exits with an error or does not produce a non-empty file.
         Exception: If there is an error during the subprocess call.
         """
         logging.info(f"Performing backup for model: {model_path}")
         try:
-            subprocess.run([
+            result = subprocess.run([
                 rstoollocation, "createLocalRvt", str(model_path),
                 "-server", servername,
                 "-destination", str(temp_path), "-overwrite"
-            ], capture_output=True)
+            ], capture_output=True, text=True, errors='replace')
+            if result.returncode != 0:
+                output = (result.stderr or result.stdout or '').strip()
+                raise RuntimeError(f"createLocalRvt exited with code {result.returncode}: {output}")
+            if not temp_path.is_file() or temp_path.stat().st_size == 0:
+                raise RuntimeError(f"createLocalRvt did not produce a non-empty file at '{temp_path}'")
         except Exception as e:
             logging.error(f"Error during backup subprocess for model '{model_path}': {e}")
             raise
@@ -325,7 +1304,13 @@ class BackupManager:
                 drive_relative_path,
                 drive_api=None,
                 max_attempts=3,
-                wait_seconds=30
+                wait_seconds=5,
+                folder_cache=None,
+                manifest=None,
+                skip_unchanged=False,
+                chunk_size=DEFAULT_CHUNK_SIZE,
+                session_store=None,
+                app_properties=None
         ):
             """
             Upload a file to Google Drive, creating the necessary folder structure.
@@ -335,7 +1320,17 @@ class BackupManager:
             :param drive_relative_path: Subfolder path in Google Drive (e.g. '2612_2_Tel_Aviv').
             :param drive_api: Optionally, a GoogleDriveAPI instance to reuse.
             :param max_attempts: Attempts to upload the file to Google Drive.
-            :param wait_seconds: Waiting time between attempts.
+            :param wait_seconds: Waiting time between attempts. Transient API errors are already retried
+                with backoff by the client's rate limiter, these attempts cover what is left.
+            :param folder_cache: Optionally, a DriveFolderCache shared between uploads.
+            :param manifest: Optionally, an UploadManifest to record verified uploads in.
+            :param skip_unchanged: Skip the upload when Drive already holds identical content.
+            :param chunk_size: Bytes sent per resumable chunk.
+            :param session_store: Optionally, an UploadSessionStore so a retry or the next run
+                resumes an interrupted upload instead of restarting from byte zero.
+            :param app_properties: Optionally, Drive appProperties to set on the uploaded file.
+            :return: True if the file was uploaded and its Drive md5Checksum and size match the bytes sent,
+                False if it was skipped as unchanged.
             """
             try:
                 source = Path(source_path)
@@ -345,7 +1340,7 @@ class BackupManager:
 
                 # Use provided API instance or create new one
                 if drive_api is None:
-                    drive_api = GoogleDriveAPI('credentials.json', 'token.json')
+                    drive_api = GoogleDriveAPI('credentials.json', 'token.json', folder_cache=folder_cache)
 
                 # Split into folder path and filename
                 rel_path = PurePath(drive_relative_path)
@@ -364,22 +1359,58 @@ class BackupManager:
                         f"under root ID '{drive_root_id}': {e}\n{traceback.format_exc()}"
                     )
 
-                # 2. Upload file to this folder, overwriting if exists
+                # 2. Skip the upload when the content is already in Drive, judged by Drive's own
+                # md5Checksum. The file is only hashed up front when the size matches; otherwise
+                # the upload computes the MD5
+                existing = None
+                if skip_unchanged:
+                    local_size = source.stat().st_size
+                    existing = drive_api.find_file(drive_filename, folder_id)
+                    if existing and existing.get('size') is not None and int(existing['size']) == local_size:
+                        local_md5 = file_md5(source)
+                        if existing.get('md5Checksum') == local_md5:
+                            if manifest:
+                                manifest.record(drive_root_id, drive_relative_path, existing['id'], local_md5, local_size)
+                            logging.info(f"Skipped unchanged '{drive_relative_path}' (matches Drive md5Checksum)")
+                            return False
+
+                def log_progress(sent, total):
+                    percent = 100 * sent / total if total else 100
+                    logging.info(
+                        f"Uploading '{drive_relative_path}': {percent:.0f}% "
+                        f"({sent / 1048576:.1f} of {total / 1048576:.1f} MB)")
+
+                # 3. Upload file to this folder, overwriting if exists
                 for attempt in range(1, max_attempts + 1):
                     try:
-                        file_id = drive_api.upload_file(
+                        uploaded = drive_api.upload_file(
                             str(source),
                             folder_id=folder_id,
                             overwrite=True,
-                            drive_filename=drive_filename
+                            drive_filename=drive_filename,
+                            existing=existing,
+                            chunk_size=chunk_size,
+                            session_store=session_store,
+                            progress_callback=log_progress,
+                            app_properties=app_properties
                         )
                         logging.info(
-                            f"Uploaded '{source}' to Google Drive folder '{drive_relative_path}' as file ID {file_id}")
-                        break  # Success!
+                            f"Uploaded '{source}' to Google Drive folder '{drive_relative_path}' as file ID "
+                            f"{uploaded['id']} (verified md5 {uploaded['md5Checksum']})")
+                        if manifest:
+                            manifest.record(drive_root_id, drive_relative_path, uploaded['id'],
+                                            uploaded['md5Checksum'], int(uploaded['size']))
+                        return True
                     except Exception as e:
                         logging.error(f"Upload attempt {attempt} failed: {e}")
+                        if is_not_found_error(e) and attempt < max_attempts:
+                            # The cached folder was deleted in Drive: resolve it again and retry at once
+                            drive_api.invalidate_folder(folder_path, drive_root_id)
+                            folder_id = drive_api.get_or_create_folder(folder_path, drive_root_id)
+                            existing = None
+                            continue
                         if attempt < max_attempts:
-                            logging.info(f"Retrying in {wait_seconds} seconds...")
+                            logging.info(f"Retrying in {wait_seconds} seconds, resuming from the last chunk...")
                             time.sleep(wait_seconds)
                         else:
                             logging.error("Max upload attempts reached. Upload failed.")
@@ -389,35 +1420,6 @@ class BackupManager:
                 logging.error(f"Error uploading file to Google Drive: {e}")
                 raise
 
-    @staticmethod
-    def _verify_backup(model_path, target_path):
-        """
-        Verifies that the backup file exists and was recently updated.
-
-        Parameters:
-        model_path (str): The path of the model being backed up.
-        target_path (Path): The target path where the backup file is located.
-
-        Raises:
-        FileNotFoundError: If the target backup file does not exist.
-        Exception: If there is an error during verification or if the backup file is outdated.
-        """
-        try:
-            if target_path.exists():
-                modification_time = datetime.fromtimestamp(target_path.stat().st_mtime, timezone.utc)
-                if (datetime.now().astimezone(timezone.utc) - modification_time).total_seconds() < 28800:  # 8 hours
-                    logging.info(f"Backup successfully updated: {target_path}")
-                else:
-                    logging.warning(f"Backup file not updated within the last 8 hours: {target_path}")
-            else:
-                logging.error(f"Backup file does not exist: {target_path}")
-        except FileNotFoundError as e:
-            logging.error(f"File not found during verification for model '{model_path}': {e}")
-            raise
-        except Exception as e:
-            logging.error(f"Error verifying backup for model '{model_path}': {e}")
-            raise
-
     @staticmethod
     def _clean_temp_folder(temp_folder):
         """
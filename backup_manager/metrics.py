@@ -0,0 +1,170 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class RunMetrics:
+    """
+    Thread-safe per-stage timing and throughput of one backup run.
+
+    Every stage sample records its duration and the bytes it handled. At the end of
+    a run the samples are summarised (count, p50/p95/max, bytes, MB/s) into a JSON
+    report and a Prometheus textfile-collector metrics file, together with the run's
+    counters (e.g. Drive API requests and retries).
+    """
+    STAGES = ('scan', 'export', 'folder', 'find_file', 'compress', 'upload', 'snapshot', 'verify', 'cleanup')
+    PROMETHEUS_PREFIX = 'revit_backup'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.finished = None
+            self._samples = {stage: [] for stage in self.STAGES}
+            self._counters = {}
+
+    def record(self, stage, seconds, bytes_count=0):
+        with self._lock:
+            self._samples.setdefault(stage, []).append((seconds, bytes_count or 0))
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self):
+        with self._lock:
+            return {name: round(value, 3) for name, value in sorted(self._counters.items())}
+
+    @contextmanager
+    def stage(self, stage, bytes_count=0):
+        """
+        Times the enclosed block as one sample of stage. The yielded dict's 'bytes'
+        entry may be set inside the block when the size is only known afterwards.
+        """
+        sample = {'bytes': bytes_count}
+        start_time = time.perf_counter()
+        try:
+            yield sample
+        finally:
+            self.record(stage, time.perf_counter() - start_time, sample['bytes'])
+
+    def finish(self):
+        with self._lock:
+            self.finished = time.time()
+
+    def stage_summary(self):
+        """
+        Returns:
+        dict: Per stage: count, total/p50/p95/max seconds, bytes and MB/s.
+        """
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        summary = {}
+        for stage, values in samples.items():
+            durations = sorted(seconds for seconds, _ in values)
+            total_seconds = sum(durations)
+            total_bytes = sum(bytes_count for _, bytes_count in values)
+            summary[stage] = {
+                'count': len(durations),
+                'total_seconds': round(total_seconds, 3),
+                'p50_seconds': round(_percentile(durations, 0.50), 3),
+                'p95_seconds': round(_percentile(durations, 0.95), 3),
+                'max_seconds': round(durations[-1], 3) if durations else 0.0,
+                'bytes': total_bytes,
+                'mb_per_second': round(total_bytes / 1048576 / total_seconds, 3) if total_bytes and total_seconds else 0.0
+            }
+        return summary
+
+    def report(self, summary=None, extra=None):
+        """
+        Builds the machine-readable run report.
+
+        Parameters:
+        summary (RunSummary): Optionally, the run's model outcome counts.
+        extra (dict): Optionally, more top-level entries.
+        """
+        finished = self.finished or time.time()
+        report = {
+            'started': self.started,
+            'finished': finished,
+            'duration_seconds': round(finished - self.started, 3),
+            'models': dict(summary.counts) if summary else {},
+            'stages': self.stage_summary(),
+            'counters': self.counters()
+        }
+        report.update(extra or {})
+        return report
+
+    def write_json(self, path, summary=None, extra=None):
+        _write_atomically(path, json.dumps(self.report(summary, extra), indent=2))
+
+    def write_prometheus(self, path, summary=None):
+        """
+        Writes the run's metrics in Prometheus text exposition format, for node_exporter's textfile collector.
+        """
+        prefix = self.PROMETHEUS_PREFIX
+        report = self.report(summary)
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Duration of one model's pass through a backup stage.",
+            f"# TYPE {prefix}_stage_duration_seconds summary"
+        ]
+        for stage, values in report['stages'].items():
+            lines.append(f'{prefix}_stage_duration_seconds{{stage="{stage}",quantile="0.5"}} {values["p50_seconds"]}')
+            lines.append(f'{prefix}_stage_duration_seconds{{stage="{stage}",quantile="0.95"}} {values["p95_seconds"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {values["total_seconds"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {values["count"]}')
+        lines += [
+            f"# HELP {prefix}_stage_bytes Bytes handled by a backup stage in the last run.",
+            f"# TYPE {prefix}_stage_bytes gauge"
+        ]
+        lines += [f'{prefix}_stage_bytes{{stage="{stage}"}} {values["bytes"]}'
+                  for stage, values in report['stages'].items()]
+        lines += [
+            f"# HELP {prefix}_stage_throughput_mb_per_second Throughput of a backup stage in the last run.",
+            f"# TYPE {prefix}_stage_throughput_mb_per_second gauge"
+        ]
+        lines += [f'{prefix}_stage_throughput_mb_per_second{{stage="{stage}"}} {values["mb_per_second"]}'
+                  for stage, values in report['stages'].items()]
+        lines += [
+            f"# HELP {prefix}_models Models per outcome in the last run.",
+            f"# TYPE {prefix}_models gauge"
+        ]
+        lines += [f'{prefix}_models{{outcome="{outcome}"}} {count}' for outcome, count in report['models'].items()]
+        for name, value in report['counters'].items():
+            lines += [
+                f"# HELP {prefix}_{name} {name.replace('_', ' ').capitalize()} in the last run.",
+                f"# TYPE {prefix}_{name} gauge",
+                f"{prefix}_{name} {value}"
+            ]
+        lines += [
+            f"# HELP {prefix}_run_duration_seconds Wall time of the last run.",
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f"{prefix}_run_duration_seconds {report['duration_seconds']}",
+            f"# HELP {prefix}_last_run_timestamp_seconds End of the last run.",
+            f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+            f"{prefix}_last_run_timestamp_seconds {report['finished']:.0f}"
+        ]
+        _write_atomically(path, '\n'.join(lines) + '\n')
+
+
+def _write_atomically(path, text):
+    # Readers such as the textfile collector must never see a half-written file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + '.tmp')
+    temp_path.write_text(text, encoding='utf-8')
+    os.replace(temp_path, path)
@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class ModelState:
+    model_path: str
+    db_size: int
+    db_mtime_ns: int
+    scanned_watermark: str
+    backed_up_watermark: str
+    backed_up_at: float = None
+
+
+# noinspection SqlNoDataSourceInspection
+class ModelStateStore:
+    """
+    Per-model change-detection state.
+
+    Records the Model.db3 size/mtime and ModelHistory MAX(Time) seen by the last scan
+    (the scanned watermark) and the watermark of the last successful backup, so a
+    model is selected whenever its history moved since it was last backed up,
+    however long ago that was. Thread-safe.
+    """
+    CREATE_QUERY = (
+        "CREATE TABLE IF NOT EXISTS ModelState ("
+        "ModelPath TEXT PRIMARY KEY, DbSize INTEGER, DbMtimeNs INTEGER, "
+        "ScannedWatermark TEXT, BackedUpWatermark TEXT, BackedUpAt REAL)"
+    )
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+        db_path (str): Path of the SQLite file.
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(self.CREATE_QUERY)
+
+    def get(self, model_path):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT ModelPath, DbSize, DbMtimeNs, ScannedWatermark, BackedUpWatermark, BackedUpAt "
+                "FROM ModelState WHERE ModelPath = ?", (model_path,)
+            ).fetchone()
+        return ModelState(*row) if row else None
+
+    def record_scan(self, model_path, db_size, db_mtime_ns, watermark, baseline=False):
+        """
+        Stores the result of opening a model's Model.db3.
+
+        Parameters:
+        baseline (bool): Also treat the watermark as backed up. Used the first time a model is seen
+        and it was not selected, so earlier history does not trigger a backup later.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO ModelState (ModelPath, DbSize, DbMtimeNs, ScannedWatermark, BackedUpWatermark) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(ModelPath) DO UPDATE SET DbSize = excluded.DbSize, DbMtimeNs = excluded.DbMtimeNs, "
+                "ScannedWatermark = excluded.ScannedWatermark",
+                (model_path, db_size, db_mtime_ns, watermark, watermark if baseline else None)
+            )
+
+    def mark_backed_up(self, model_path, watermark=None):
+        """
+        Records a successful backup of the model at its last scanned watermark.
+
+        Parameters:
+        watermark (str): Optionally, the watermark that was backed up instead, e.g. the one a work queue
+        item was planned with, since the model may have been scanned again in the meantime.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE ModelState SET BackedUpWatermark = COALESCE(?, ScannedWatermark), BackedUpAt = ? "
+                "WHERE ModelPath = ?",
+                (watermark, time.time(), model_path)
+            )
@@ -0,0 +1,135 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackupPipeline:
+    """
+    Two-stage export/upload pipeline.
+
+    A bounded pool of export workers feeds a queue that a separate pool of upload
+    workers drains, so the CPU-heavy RevitServerTool export of one model overlaps
+    with the network-heavy upload of another. Every model is isolated: an error in
+    either stage is logged and the remaining models carry on.
+    """
+    _STOP = object()
+
+    def __init__(self, export_stage, upload_stage, export_workers=1, upload_workers=1, queue_size=None):
+        """
+        Parameters:
+        export_stage (callable): Called with a model path, returns the item handed to the upload stage,
+        or None if the export failed and the model should be dropped.
+        upload_stage (callable): Called with an item returned by export_stage.
+        export_workers (int): Number of concurrent export workers.
+        upload_workers (int): Number of concurrent upload workers.
+        queue_size (int): Maximum number of finished exports waiting for upload.
+        Export workers block when the queue is full. Defaults to upload_workers.
+        """
+        self.export_stage = export_stage
+        self.upload_stage = upload_stage
+        self.export_workers = max(1, int(export_workers))
+        self.upload_workers = max(1, int(upload_workers))
+        self.queue_size = max(1, int(queue_size or self.upload_workers))
+
+    def run(self, model_paths):
+        """
+        Runs every model through both stages and returns when all of them are done.
+
+        Parameters:
+        model_paths (iterable): The model paths to process, in the order exports should start. The next
+        path is only taken once an export worker is free, that is, once its previous export was handed
+        to the upload queue, so the iterable may produce (e.g. claim) paths lazily.
+        """
+        handoff = queue.Queue(maxsize=self.queue_size)
+        free_exporters = threading.BoundedSemaphore(self.export_workers)
+        uploaders = [
+            threading.Thread(target=self._upload_worker, args=(handoff,), name=f"upload-{index}", daemon=True)
+            for index in range(self.upload_workers)
+        ]
+        for uploader in uploaders:
+            uploader.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.export_workers, thread_name_prefix='export') as executor:
+                paths = iter(model_paths)
+                while True:
+                    free_exporters.acquire()
+                    model_path = next(paths, self._STOP)
+                    if model_path is self._STOP:
+                        break
+                    executor.submit(self._export_worker, model_path, handoff, free_exporters)
+        finally:
+            for _ in uploaders:
+                handoff.put(self._STOP)
+            for uploader in uploaders:
+                uploader.join()
+
+    def _export_worker(self, model_path, handoff, free_exporters):
+        # The worker only counts as free once its export is in the upload queue
+        try:
+            item = self.export_stage(model_path)
+            if item is not None:
+                handoff.put(item)
+        except Exception as e:
+            logging.error(f"Error during export for model '{model_path}': {e}")
+        finally:
+            free_exporters.release()
+
+    def _upload_worker(self, handoff):
+        while True:
+            item = handoff.get()
+            if item is self._STOP:
+                break
+            try:
+                self.upload_stage(item)
+            except Exception as e:
+                logging.error(f"Error during upload for '{item}': {e}")
+
+
+class DiskBudget:
+    """
+    Admits exports only while their estimated sizes fit a temp-disk budget.
+
+    Reservations are released when a model's temp export is cleaned up. An export larger
+    than the whole budget is admitted once nothing else is in flight, so it runs alone
+    rather than never. A budget of 0 or None admits everything.
+    """
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes or 0
+        self.in_use = 0
+        self._draining = 0
+        self._draining_bytes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        """
+        Blocks until size bytes fit the budget, then reserves them.
+        """
+        with self._condition:
+            while self._draining or (self.budget_bytes and self.in_use
+                                     and self.in_use + size > self.budget_bytes):
+                self._condition.wait()
+            self.in_use += size
+
+    def release(self, size):
+        with self._condition:
+            self.in_use = max(0, self.in_use - size)
+            self._condition.notify_all()
+
+    def wait_until_alone(self, size):
+        """
+        Stops new admissions and waits until only the reservations of waiting callers
+        (size bytes for this one) are left, e.g. to retry an export that ran out of disk space.
+        """
+        with self._condition:
+            self._draining += 1
+            self._draining_bytes += size
+            self._condition.notify_all()
+            try:
+                while self.in_use > self._draining_bytes:
+                    self._condition.wait()
+            finally:
+                self._draining -= 1
+                self._draining_bytes -= size
+                self._condition.notify_all()
@@ -0,0 +1,196 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class JournaledExport:
+    temp_path: str
+    temp_size: int
+    temp_mtime_ns: int
+    source_size: int
+    source_mtime_ns: int
+    export_seconds: float
+
+
+# noinspection SqlNoDataSourceInspection
+class RunJournal:
+    """
+    Per-run record of every model's progress, so a run that was killed can be resumed.
+
+    A run plans its models under a run ID; each model then moves from 'planned' to
+    'exported' (the temp export is complete), 'uploaded' (Drive holds a copy whose
+    checksum matched the export) and 'verified' (the backup is complete and recorded),
+    or to 'failed'. Resuming a run ID backs up only its models that are not verified.
+    The journal keeps the size and mtime of each export and of the model's Model.db3
+    at export time, so an export left in the temp folder is reused only while both are
+    unchanged. Exports are reused by any later run, so the export of a model whose upload
+    failed is uploaded again, resuming its saved upload session, instead of exported again.
+    Thread-safe.
+    """
+    CREATE_QUERIES = (
+        "CREATE TABLE IF NOT EXISTS Run ("
+        "RunId TEXT PRIMARY KEY, Kind TEXT, StartedAt REAL, FinishedAt REAL)",
+        "CREATE TABLE IF NOT EXISTS RunModel ("
+        "RunId TEXT NOT NULL, ModelPath TEXT NOT NULL, Position INTEGER, State TEXT NOT NULL, "
+        "TempPath TEXT, TempSize INTEGER, TempMtimeNs INTEGER, SourceSize INTEGER, SourceMtimeNs INTEGER, "
+        "ExportSeconds REAL, Error TEXT, UpdatedAt REAL, PRIMARY KEY (RunId, ModelPath))"
+    )
+    PLANNED = 'planned'
+    EXPORTED = 'exported'
+    UPLOADED = 'uploaded'
+    VERIFIED = 'verified'
+    FAILED = 'failed'
+    KEEP_DAYS = 30
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+        db_path (str): Path of the SQLite file.
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._connection:
+            for query in self.CREATE_QUERIES:
+                self._connection.execute(query)
+
+    def run_kind(self, run_id):
+        """
+        Returns:
+        str: The kind of the journaled run, or None if there is no run with that ID.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT Kind FROM Run WHERE RunId = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def started_at(self, run_id):
+        """
+        Returns:
+        float: When the journaled run was first started, or None if there is no run with that ID.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT StartedAt FROM Run WHERE RunId = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def latest_unfinished(self, kind=None):
+        """
+        Parameters:
+        kind (str): Optionally, only consider runs of this kind.
+
+        Returns:
+        str: The ID of the latest run that never finished (e.g. was killed), or None.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT RunId FROM Run WHERE FinishedAt IS NULL AND (? IS NULL OR Kind = ?) "
+                "ORDER BY StartedAt DESC LIMIT 1", (kind, kind)
+            ).fetchone()
+        return row[0] if row else None
+
+    def plan(self, run_id, kind, model_paths):
+        """
+        Starts a run with the given models, in the order they are to be backed up.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO Run (RunId, Kind, StartedAt) VALUES (?, ?, ?)", (run_id, kind, now))
+            self._connection.executemany(
+                "INSERT INTO RunModel (RunId, ModelPath, Position, State, UpdatedAt) VALUES (?, ?, ?, 'planned', ?)",
+                [(run_id, model_path, position, now) for position, model_path in enumerate(model_paths)]
+            )
+
+    def unfinished(self, run_id):
+        """
+        Reopens a run for resuming.
+
+        Returns:
+        list: The run's models that are not verified, in planned order.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE Run SET FinishedAt = NULL WHERE RunId = ?", (run_id,))
+            return [row[0] for row in self._connection.execute(
+                "SELECT ModelPath FROM RunModel WHERE RunId = ? AND State != 'verified' ORDER BY Position",
+                (run_id,))]
+
+    def record_export(self, run_id, model_path, temp_path, source_stat, export_seconds):
+        """
+        Marks a model exported, keeping what is needed to check the export is still valid later.
+
+        Parameters:
+        temp_path (Path): The complete temp export.
+        source_stat (os.stat_result): The model's Model.db3 as it was before the export started.
+        export_seconds (float): How long the export took.
+        """
+        temp_stat = temp_path.stat()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE RunModel SET State = 'exported', TempPath = ?, TempSize = ?, TempMtimeNs = ?, "
+                "SourceSize = ?, SourceMtimeNs = ?, ExportSeconds = ?, Error = NULL, UpdatedAt = ? "
+                "WHERE RunId = ? AND ModelPath = ?",
+                (str(temp_path), temp_stat.st_size, temp_stat.st_mtime_ns, source_stat.st_size,
+                 source_stat.st_mtime_ns, export_seconds, time.time(), run_id, model_path)
+            )
+
+    def reusable_export(self, model_path, temp_path, source_stat):
+        """
+        Returns:
+        JournaledExport: The model's latest export at temp_path, from this run or an earlier one, if it has
+        not been uploaded yet and neither the temp file nor the model's Model.db3 changed since, otherwise None.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT TempPath, TempSize, TempMtimeNs, SourceSize, SourceMtimeNs, ExportSeconds FROM RunModel "
+                "WHERE ModelPath = ? AND State = 'exported' AND TempPath = ? ORDER BY UpdatedAt DESC LIMIT 1",
+                (model_path, str(temp_path))
+            ).fetchone()
+        if row is None:
+            return None
+        export = JournaledExport(*row)
+        if (export.source_size, export.source_mtime_ns) != (source_stat.st_size, source_stat.st_mtime_ns):
+            return None
+        try:
+            temp_stat = Path(export.temp_path).stat()
+        except OSError:
+            return None
+        if (export.temp_size, export.temp_mtime_ns) != (temp_stat.st_size, temp_stat.st_mtime_ns):
+            return None
+        return export
+
+    def set_state(self, run_id, model_path, state, error=None):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE RunModel SET State = ?, Error = ?, UpdatedAt = ? WHERE RunId = ? AND ModelPath = ?",
+                (state, error, time.time(), run_id, model_path)
+            )
+
+    def finish(self, run_id):
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE Run SET FinishedAt = ? WHERE RunId = ?", (time.time(), run_id))
+
+    def counts(self, run_id):
+        """
+        Returns:
+        dict: The number of the run's models per state.
+        """
+        with self._lock:
+            return dict(self._connection.execute(
+                "SELECT State, COUNT(*) FROM RunModel WHERE RunId = ? GROUP BY State", (run_id,)
+            ).fetchall())
+
+    def prune(self):
+        """
+        Removes the runs started more than KEEP_DAYS ago.
+        """
+        cutoff = time.time() - self.KEEP_DAYS * 86400
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM RunModel WHERE RunId IN (SELECT RunId FROM Run WHERE StartedAt < ?)", (cutoff,))
+            self._connection.execute("DELETE FROM Run WHERE StartedAt < ?", (cutoff,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
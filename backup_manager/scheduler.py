@@ -0,0 +1,257 @@
+import math
+import sqlite3
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Assumed until the history has samples: createLocalRvt and upload throughput, and a fixed overhead per model
+DEFAULT_EXPORT_BYTES_PER_SECOND = 50 * 1024 * 1024
+DEFAULT_UPLOAD_BYTES_PER_SECOND = 10 * 1024 * 1024
+DEFAULT_OVERHEAD_SECONDS = 10.0
+# A model never backed up counts as this many days stale
+NEVER_BACKED_UP_DAYS = 30
+
+
+@dataclass
+class ModelCost:
+    export_seconds: float
+    upload_seconds: float
+
+
+@dataclass
+class ScheduledModel:
+    model_path: str
+    priority: float
+    cost: ModelCost
+
+
+# noinspection SqlNoDataSourceInspection
+class BackupHistoryStore:
+    """
+    Export and upload durations and sizes of past model backups, for cost prediction.
+    Backups whose upload was skipped as unchanged have no upload duration. Thread-safe.
+    """
+    CREATE_QUERIES = (
+        "CREATE TABLE IF NOT EXISTS BackupHistory ("
+        "ModelPath TEXT NOT NULL, FinishedAt REAL, ExportSeconds REAL, UploadSeconds REAL, Bytes INTEGER)",
+        "CREATE INDEX IF NOT EXISTS BackupHistoryByModel ON BackupHistory (ModelPath, FinishedAt)"
+    )
+    SAMPLES_PER_MODEL = 5
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+        db_path (str): Path of the SQLite file.
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._connection:
+            for query in self.CREATE_QUERIES:
+                self._connection.execute(query)
+
+    def record(self, model_path, export_seconds, upload_seconds, bytes_count):
+        """
+        Parameters:
+        upload_seconds (float): How long the upload took, or None if the upload was skipped as unchanged.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO BackupHistory (ModelPath, FinishedAt, ExportSeconds, UploadSeconds, Bytes) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (model_path, time.time(), export_seconds, upload_seconds, bytes_count)
+            )
+
+    def recent(self, model_paths):
+        """
+        Returns:
+        dict: Per model path, its latest (export seconds, upload seconds or None, bytes) samples, newest first.
+        """
+        wanted = set(model_paths)
+        samples = {}
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT ModelPath, ExportSeconds, UploadSeconds, Bytes FROM ("
+                "SELECT *, ROW_NUMBER() OVER (PARTITION BY ModelPath ORDER BY FinishedAt DESC) AS Recency "
+                "FROM BackupHistory) WHERE Recency <= ? ORDER BY ModelPath, Recency", (self.SAMPLES_PER_MODEL,)
+            ).fetchall()
+        for model_path, export_seconds, upload_seconds, bytes_count in rows:
+            if model_path in wanted:
+                samples.setdefault(model_path, []).append((export_seconds, upload_seconds, bytes_count))
+        return samples
+
+    def last_finished(self):
+        """
+        Returns:
+        dict: The time of the latest recorded backup per model path.
+        """
+        with self._lock:
+            return dict(self._connection.execute(
+                "SELECT ModelPath, MAX(FinishedAt) FROM BackupHistory GROUP BY ModelPath"
+            ).fetchall())
+
+    def throughput(self):
+        """
+        Returns:
+        tuple: Export bytes per second over all recorded backups and upload bytes per second over
+        those that uploaded, or None where there are no samples.
+        """
+        with self._lock:
+            exported, export_seconds, uploaded, upload_seconds = self._connection.execute(
+                "SELECT SUM(Bytes), SUM(ExportSeconds), SUM(CASE WHEN UploadSeconds IS NOT NULL THEN Bytes END), "
+                "SUM(UploadSeconds) FROM BackupHistory"
+            ).fetchone()
+        return (exported / export_seconds if exported and export_seconds else None,
+                uploaded / upload_seconds if uploaded and upload_seconds else None)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def next_window_end(window_end, now=None):
+    """
+    Returns the next occurrence of a local time of day given as 'HH:MM', as a timestamp.
+    """
+    now = datetime.fromtimestamp(now if now is not None else time.time())
+    hour, minute = (int(part) for part in window_end.split(':'))
+    end = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if end <= now:
+        end += timedelta(days=1)
+    return end.timestamp()
+
+
+def window_deadline(window_end, window_start=None, started=None, now=None):
+    """
+    Returns the timestamp a run must finish by: the first time of day window_end after the run started.
+    A run started outside the window from window_start to window_end (which may span midnight) gets a
+    deadline of now, so nothing is admitted.
+
+    Parameters:
+    window_end (str): The local time the backup window ends, 'HH:MM'.
+    window_start (str): Optionally, the local time the backup window starts, 'HH:MM'.
+    started (float): When the run started, e.g. a resumed run's original start. Defaults to now.
+    now (float): The current timestamp.
+    """
+    now = time.time() if now is None else now
+    started = now if started is None else started
+    if window_start is not None:
+        start_minute, end_minute = (_minute_of_day(value) for value in (window_start, window_end))
+        started_at = datetime.fromtimestamp(started)
+        minute = started_at.hour * 60 + started_at.minute
+        if start_minute <= end_minute:
+            inside = start_minute <= minute < end_minute
+        else:
+            inside = minute >= start_minute or minute < end_minute
+        if not inside:
+            return now
+    return next_window_end(window_end, started)
+
+
+def _minute_of_day(time_of_day):
+    hour, minute = (int(part) for part in time_of_day.split(':'))
+    return hour * 60 + minute
+
+
+class BackupScheduler:
+    """
+    Orders a run's models by priority and keeps the run inside its backup window.
+
+    A model's priority grows with its recent save activity, the time since its last
+    successful backup and its size; its cost is predicted from the median of its
+    recent export and upload durations, or from its estimated size at the average
+    throughput seen so far. Uploads skipped as unchanged do not count: a model that is
+    backed up again has changed, so its upload is predicted from real uploads only. With a deadline, models are admitted in priority order
+    while the predicted export and upload work fits the remaining time of the
+    export and upload workers; the rest are deferred to the next run.
+    """
+    ACTIVITY_DAYS = 7
+
+    def __init__(self, history, model_state, activity_store=None, export_workers=1, upload_workers=1):
+        self.history = history
+        self.model_state = model_state
+        self.activity_store = activity_store
+        self.export_workers = max(1, export_workers)
+        self.upload_workers = max(1, upload_workers)
+
+    def predict(self, model_paths, size_estimates):
+        """
+        Returns:
+        dict: The predicted ModelCost per model path.
+        """
+        samples = self.history.recent(model_paths)
+        export_rate, upload_rate = self.history.throughput()
+        export_rate = export_rate or DEFAULT_EXPORT_BYTES_PER_SECOND
+        upload_rate = upload_rate or DEFAULT_UPLOAD_BYTES_PER_SECOND
+        costs = {}
+        for model_path in model_paths:
+            model_samples = samples.get(model_path)
+            size = size_estimates.get(model_path, 0)
+            if model_samples:
+                upload_seconds = [sample[1] for sample in model_samples if sample[1] is not None]
+                costs[model_path] = ModelCost(
+                    statistics.median(sample[0] for sample in model_samples),
+                    statistics.median(upload_seconds) if upload_seconds
+                    else (size or model_samples[0][2] or 0) / upload_rate)
+            else:
+                costs[model_path] = ModelCost(DEFAULT_OVERHEAD_SECONDS + size / export_rate, size / upload_rate)
+        return costs
+
+    def prioritize(self, model_paths, size_estimates, now=None):
+        """
+        Returns:
+        dict: The priority score per model path, higher first.
+        """
+        now = time.time() if now is None else now
+        saves = {}
+        if self.activity_store is not None:
+            saves = self.activity_store.saves_since(now - self.ACTIVITY_DAYS * 86400)
+        last_finished = self.history.last_finished()
+        priorities = {}
+        for model_path in model_paths:
+            state = self.model_state.get(model_path)
+            backed_up_at = max(filter(None, (state.backed_up_at if state else None, last_finished.get(model_path))),
+                               default=None)
+            stale_days = (now - backed_up_at) / 86400 if backed_up_at else NEVER_BACKED_UP_DAYS
+            size_gb = size_estimates.get(model_path, 0) / 1024 ** 3
+            priorities[model_path] = (2.0 * math.log1p(saves.get(model_path, 0))
+                                      + 1.5 * math.log1p(max(0.0, stale_days))
+                                      + 0.5 * math.log1p(size_gb))
+        return priorities
+
+    def schedule(self, model_paths, size_estimates, deadline=None, now=None):
+        """
+        Parameters:
+        model_paths (list): The models to back up.
+        size_estimates (dict): Estimated export size per model path.
+        deadline (float): Optionally, the timestamp the run must finish by.
+
+        Returns:
+        tuple: (admitted, deferred) lists of ScheduledModel, in priority order.
+        """
+        now = time.time() if now is None else now
+        costs = self.predict(model_paths, size_estimates)
+        priorities = self.prioritize(model_paths, size_estimates, now)
+        ordered = sorted(
+            (ScheduledModel(model_path, priorities[model_path], costs[model_path]) for model_path in model_paths),
+            key=lambda model: model.priority, reverse=True)
+        if deadline is None:
+            return ordered, []
+        remaining = max(0.0, deadline - now)
+        export_capacity = remaining * self.export_workers
+        upload_capacity = remaining * self.upload_workers
+        admitted, deferred = [], []
+        for model in ordered:
+            fits = (model.cost.export_seconds + model.cost.upload_seconds <= remaining
+                    and model.cost.export_seconds <= export_capacity
+                    and model.cost.upload_seconds <= upload_capacity)
+            if fits:
+                export_capacity -= model.cost.export_seconds
+                upload_capacity -= model.cost.upload_seconds
+                admitted.append(model)
+            else:
+                deferred.append(model)
+        return admitted, deferred
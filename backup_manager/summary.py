@@ -0,0 +1,20 @@
+import threading
+
+
+class RunSummary:
+    """
+    Thread-safe per-run counters of model outcomes.
+    """
+    OUTCOMES = ('uploaded', 'skipped_unchanged', 'failed', 'deferred')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {outcome: 0 for outcome in self.OUTCOMES}
+
+    def add(self, outcome):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    def __str__(self):
+        with self._lock:
+            return ', '.join(f"{outcome}: {count}" for outcome, count in self.counts.items())
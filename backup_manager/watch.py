@@ -0,0 +1,87 @@
+import time
+from collections import deque
+
+
+class EditDebouncer:
+    """
+    Holds back edited models until their saves have settled.
+
+    A model is ready once its history watermark has not moved for settle_seconds, so a
+    burst of saves results in one backup after the last of them. A model that keeps
+    being saved is still released max_delay seconds after it was first seen edited.
+    """
+
+    def __init__(self, settle_seconds, max_delay=None):
+        self.settle_seconds = settle_seconds
+        self.max_delay = max_delay
+        # Model path -> (watermark, first seen edited, last watermark change)
+        self._pending = {}
+
+    def update(self, edited, now=None):
+        """
+        Records the result of a scan.
+
+        Parameters:
+        edited (dict): History watermark per edited model path. Models missing from it are forgotten.
+
+        Returns:
+        list: The model paths that are ready, those waiting the longest first.
+        """
+        now = time.time() if now is None else now
+        pending = {}
+        for model_path, watermark in edited.items():
+            previous = self._pending.get(model_path)
+            if previous is None:
+                pending[model_path] = (watermark, now, now)
+            elif previous[0] != watermark:
+                pending[model_path] = (watermark, previous[1], now)
+            else:
+                pending[model_path] = previous
+        self._pending = pending
+        ready = [
+            model_path for model_path, (_, first_seen, changed) in pending.items()
+            if now - changed >= self.settle_seconds
+            or (self.max_delay and now - first_seen >= self.max_delay)
+        ]
+        return sorted(ready, key=lambda model_path: pending[model_path][1])
+
+    def defer(self, model_paths, now=None):
+        """
+        Restarts the wait of models that were just handed to a backup, so one that failed
+        is retried after another settle period rather than on the next scan.
+        """
+        now = time.time() if now is None else now
+        for model_path in model_paths:
+            if model_path in self._pending:
+                watermark, _, _ = self._pending[model_path]
+                self._pending[model_path] = (watermark, now, now)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class ExportRateLimiter:
+    """
+    Allows at most max_exports exports within any period seconds. A max_exports of 0 or None allows everything.
+    """
+
+    def __init__(self, max_exports, period=3600):
+        self.max_exports = max_exports or 0
+        self.period = period
+        self._started = deque()
+
+    def available(self, now=None):
+        """
+        Returns:
+        int: How many exports may start now.
+        """
+        if not self.max_exports:
+            return float('inf')
+        now = time.time() if now is None else now
+        while self._started and now - self._started[0] >= self.period:
+            self._started.popleft()
+        return max(0, self.max_exports - len(self._started))
+
+    def record(self, count, now=None):
+        now = time.time() if now is None else now
+        self._started.extend([now] * count)
@@ -0,0 +1,250 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class WorkItem:
+    model_path: str
+    server: str
+    watermark: str
+    priority: float
+    attempts: int
+    size_estimate: int = 0
+    predicted_seconds: float = 0.0
+
+
+# noinspection SqlNoDataSourceInspection
+class WorkQueue:
+    """
+    Shared SQLite queue of models to back up, for several worker processes or hosts.
+
+    A planner enqueues model paths per Revit Server. Workers claim one model at a time
+    under a lease that a heartbeat thread extends while the model is exported and
+    uploaded; a lease that runs out (crashed or disconnected worker) makes the model
+    claimable again. Claims run in IMMEDIATE transactions, so two workers never hold
+    the same model. Models are claimed by the scheduler priority they were enqueued with;
+    with a deadline, only models whose predicted duration still fits before it are
+    claimed, the rest stay pending for the next run. The database may live on a network share: it uses the default
+    rollback journal, since WAL does not work across hosts. Thread-safe.
+    """
+    CREATE_QUERIES = (
+        "CREATE TABLE IF NOT EXISTS WorkItem ("
+        "Server TEXT NOT NULL, ModelPath TEXT NOT NULL, Watermark TEXT, Priority REAL DEFAULT 0, "
+        "Status TEXT NOT NULL, Owner TEXT, LeaseExpires REAL, Attempts INTEGER DEFAULT 0, "
+        "EnqueuedAt REAL, UpdatedAt REAL, Error TEXT, SizeEstimate INTEGER DEFAULT 0, "
+        "PredictedSeconds REAL DEFAULT 0, PRIMARY KEY (Server, ModelPath))",
+        "CREATE INDEX IF NOT EXISTS WorkItemClaim ON WorkItem (Server, Status, Priority)"
+    )
+    # Columns added after the first release, for queues created before them
+    ADDED_COLUMNS = (
+        ("SizeEstimate", "INTEGER DEFAULT 0"),
+        ("PredictedSeconds", "REAL DEFAULT 0")
+    )
+    PENDING = 'pending'
+    LEASED = 'leased'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, db_path, lease_seconds=300, max_attempts=3, worker_id=None, busy_timeout=30.0):
+        """
+        Parameters:
+        db_path (str): Path of the shared SQLite file.
+        lease_seconds (float): How long a claim lasts without a heartbeat.
+        max_attempts (int): Claims of a model before it is marked failed instead of pending again.
+        worker_id (str): Name of this worker in the queue. Defaults to host name and process ID.
+        busy_timeout (float): Seconds to wait for another worker's lock on the database.
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._held = set()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(db_path), timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        with self._transaction():
+            for query in self.CREATE_QUERIES:
+                self._connection.execute(query)
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info('WorkItem')")}
+            for column, definition in self.ADDED_COLUMNS:
+                if column not in columns:
+                    self._connection.execute(f"ALTER TABLE WorkItem ADD COLUMN {column} {definition}")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def enqueue(self, items, server):
+        """
+        Adds models to the queue or makes finished ones pending again. Models currently leased keep their lease.
+
+        Parameters:
+        items (list): (model path, watermark, priority, size estimate, predicted seconds) tuples.
+            Higher priorities are claimed first.
+        server (str): The Revit Server the models belong to.
+
+        Returns:
+        int: The number of models added or made pending.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT INTO WorkItem (Server, ModelPath, Watermark, Priority, SizeEstimate, PredictedSeconds, "
+                "Status, Attempts, EnqueuedAt, UpdatedAt) VALUES (?, ?, ?, ?, ?, ?, 'pending', 0, ?, ?) "
+                "ON CONFLICT(Server, ModelPath) DO UPDATE SET Watermark = excluded.Watermark, "
+                "Priority = excluded.Priority, SizeEstimate = excluded.SizeEstimate, "
+                "PredictedSeconds = excluded.PredictedSeconds, Status = 'pending', Attempts = 0, Error = NULL, "
+                "EnqueuedAt = excluded.EnqueuedAt, UpdatedAt = excluded.UpdatedAt "
+                "WHERE WorkItem.Status != 'leased' OR WorkItem.LeaseExpires < excluded.UpdatedAt",
+                [(server, model_path, watermark, priority, size_estimate, predicted_seconds, now, now)
+                 for model_path, watermark, priority, size_estimate, predicted_seconds in items]
+            )
+            return connection.total_changes - before
+
+    def claim(self, server, deadline=None):
+        """
+        Leases the pending (or abandoned) model with the highest priority.
+
+        Parameters:
+        server (str): The Revit Server to claim a model of.
+        deadline (float): Optionally, the timestamp the work must finish by. Models whose
+            predicted duration does not fit before it are not claimed.
+
+        Returns:
+        WorkItem: The claimed model, or None if there is nothing to do (in time).
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT ModelPath, Server, Watermark, Priority, Attempts, SizeEstimate, PredictedSeconds FROM WorkItem "
+                "WHERE Server = ? AND (Status = 'pending' OR (Status = 'leased' AND LeaseExpires < ?)) "
+                "AND (? IS NULL OR ? + COALESCE(PredictedSeconds, 0) <= ?) "
+                "ORDER BY Priority DESC, EnqueuedAt LIMIT 1", (server, now, deadline, now, deadline)
+            ).fetchone()
+            if row is None:
+                return None
+            item = WorkItem(*row)
+            item.attempts += 1
+            connection.execute(
+                "UPDATE WorkItem SET Status = 'leased', Owner = ?, LeaseExpires = ?, Attempts = ?, UpdatedAt = ? "
+                "WHERE Server = ? AND ModelPath = ?",
+                (self.worker_id, now + self.lease_seconds, item.attempts, now, server, item.model_path)
+            )
+        self._held.add((item.server, item.model_path))
+        return item
+
+    def heartbeat(self):
+        """
+        Extends the leases this worker holds.
+
+        Returns:
+        int: The number of leases extended. Leases another worker took over are dropped.
+        """
+        now = time.time()
+        extended = 0
+        for server, model_path in list(self._held):
+            with self._transaction() as connection:
+                cursor = connection.execute(
+                    "UPDATE WorkItem SET LeaseExpires = ?, UpdatedAt = ? "
+                    "WHERE Server = ? AND ModelPath = ? AND Status = 'leased' AND Owner = ?",
+                    (now + self.lease_seconds, now, server, model_path, self.worker_id)
+                )
+            if cursor.rowcount:
+                extended += 1
+            else:
+                logging.warning(f"Lost the lease on '{model_path}' to another worker")
+                self._held.discard((server, model_path))
+        return extended
+
+    @contextmanager
+    def keep_alive(self, interval=None):
+        """
+        Runs heartbeat in a background thread while the block runs.
+        """
+        interval = interval or self.lease_seconds / 3
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    self.heartbeat()
+                except sqlite3.Error as e:
+                    logging.warning(f"Work queue heartbeat failed: {e}")
+
+        thread = threading.Thread(target=beat, name='work-queue-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, item, success, error=None):
+        """
+        Releases a claimed model as done, or as pending again (failed once out of attempts).
+
+        Returns:
+        bool: False if the lease had already been lost to another worker.
+        """
+        if success:
+            status = self.DONE
+        else:
+            status = self.FAILED if item.attempts >= self.max_attempts else self.PENDING
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE WorkItem SET Status = ?, Owner = NULL, LeaseExpires = NULL, Error = ?, UpdatedAt = ? "
+                "WHERE Server = ? AND ModelPath = ? AND Status = 'leased' AND Owner = ?",
+                (status, error, time.time(), item.server, item.model_path, self.worker_id)
+            )
+        self._held.discard((item.server, item.model_path))
+        return bool(cursor.rowcount)
+
+    def take_done(self, server):
+        """
+        Removes and returns the models finished since the last call, for the planner to record.
+
+        Returns:
+        list: (model path, watermark) of every done model.
+        """
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT ModelPath, Watermark FROM WorkItem WHERE Server = ? AND Status = 'done'", (server,)
+            ).fetchall()
+            connection.execute("DELETE FROM WorkItem WHERE Server = ? AND Status = 'done'", (server,))
+        return rows
+
+    def pending_paths(self, server):
+        with self._lock:
+            return [row[0] for row in self._connection.execute(
+                "SELECT ModelPath FROM WorkItem WHERE Server = ? AND Status IN ('pending', 'leased')", (server,))]
+
+    def counts(self, server=None):
+        """
+        Returns:
+        dict: The number of models per status.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT Status, COUNT(*) FROM WorkItem WHERE ? IS NULL OR Server = ? GROUP BY Status",
+                (server, server)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
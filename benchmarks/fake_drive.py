@@ -0,0 +1,250 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+QUERY_NAME = re.compile(r"name='((?:[^'\\]|\\.)*)'")
+QUERY_MIME_TYPE = re.compile(r"mimeType='([^']*)'")
+QUERY_PARENT = re.compile(r"'([^']+)' in parents")
+
+
+class FakeDrive:
+    """
+    In-memory stand-in for the Drive v3 endpoints the backup uses:
+    files.list, files.create (folders), and resumable create/update uploads.
+
+    Uploaded content is not kept, only its running MD5 and size, so large benchmark
+    runs do not hold the uploaded bytes in memory. error_rate injects 429/500/503
+    responses (429s carry Retry-After) into any request.
+    """
+
+    def __init__(self, error_rate=0.0, seed=0):
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.files = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.root_id = self.add_file({'name': 'Backups', 'mimeType': FOLDER_MIME_TYPE, 'parents': []})['id']
+        self._server = None
+
+    def add_file(self, metadata):
+        with self._lock:
+            file_id = uuid.uuid4().hex
+            entry = {'id': file_id, 'name': metadata['name'],
+                     'mimeType': metadata.get('mimeType', 'application/octet-stream'),
+                     'parents': list(metadata.get('parents', [])),
+                     'modifiedTime': _now()}
+            self.files[file_id] = entry
+            return entry
+
+    def start(self, host='127.0.0.1', port=0):
+        """
+        Starts serving in a background thread.
+
+        Returns:
+        str: The root URL to pass as api_endpoint to GoogleDriveAPI / GoogleDriveClientPool.
+        """
+        drive = self
+
+        class Handler(_DriveHandler):
+            fake = drive
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"{self.base_url}/"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self._server.server_address[0]}:{self._server.server_address[1]}"
+
+    def count(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def injected_status(self):
+        """
+        Returns:
+        int: An error status to answer the current request with, or None.
+        """
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self._random.choice((429, 500, 503))
+            return None
+
+    def list_files(self, query):
+        names = [value.replace("\\'", "'") for value in QUERY_NAME.findall(query)]
+        mime_types = QUERY_MIME_TYPE.findall(query)
+        parents = set(QUERY_PARENT.findall(query))
+        with self._lock:
+            return [
+                dict(entry) for entry in self.files.values()
+                if (not names or entry['name'] == names[0])
+                and (not mime_types or entry['mimeType'] == mime_types[0])
+                and (not parents or parents.intersection(entry['parents']))
+            ]
+
+    def open_session(self, metadata, size, file_id=None):
+        with self._lock:
+            session_id = uuid.uuid4().hex
+            self._sessions[session_id] = {
+                'metadata': metadata, 'file_id': file_id, 'size': size,
+                'offset': 0, 'md5': hashlib.md5()
+            }
+            return session_id
+
+    def write_chunk(self, session_id, start, data, total):
+        """
+        Appends a chunk to a session.
+
+        Returns:
+        dict: The file's metadata when the upload completed, otherwise None.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                raise KeyError(session_id)
+            if data and start == session['offset']:
+                session['md5'].update(data)
+                session['offset'] += len(data)
+            if total is not None:
+                session['size'] = total
+            if session['size'] is None or session['offset'] < session['size']:
+                return None
+            del self._sessions[session_id]
+        if session['file_id']:
+            entry = self.files[session['file_id']]
+        else:
+            entry = self.add_file(session['metadata'])
+        entry.update({'md5Checksum': session['md5'].hexdigest(), 'size': str(session['offset']),
+                      'modifiedTime': _now()})
+        if session['metadata'].get('appProperties'):
+            entry.setdefault('appProperties', {}).update(session['metadata']['appProperties'])
+        return dict(entry)
+
+    def session_offset(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return None if session is None else session['offset']
+
+
+class _DriveHandler(BaseHTTPRequestHandler):
+    fake = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        endpoint = self._endpoint(method, url.path, params)
+        self.fake.count(endpoint)
+        status = self.fake.injected_status()
+        if status:
+            self.fake.count('injected_error')
+            headers = {'Retry-After': '1'} if status == 429 else {}
+            return self._send_json(status, {'error': {'code': status, 'message': 'injected'}}, headers)
+        try:
+            handler = getattr(self, f"_{endpoint}", None)
+            if handler is None:
+                return self._send_json(404, {'error': {'code': 404, 'message': f"no endpoint {url.path}"}})
+            handler(url, params, body)
+        except KeyError as e:
+            self._send_json(404, {'error': {'code': 404, 'message': f"not found: {e}"}})
+
+    @staticmethod
+    def _endpoint(method, path, params):
+        if path.startswith('/upload/session/'):
+            return 'upload_chunk'
+        if path.startswith('/upload/drive/v3/files'):
+            return 'upload_start_update' if method == 'PATCH' else 'upload_start_create'
+        if path.rstrip('/') == '/drive/v3/files':
+            return 'files_list' if method == 'GET' else 'files_create'
+        return 'unknown'
+
+    def _files_list(self, url, params, body):
+        files = self.fake.list_files(params.get('q', ''))
+        page_size = int(params.get('pageSize', 100))
+        start = int(params.get('pageToken') or 0)
+        result = {'files': files[start:start + page_size]}
+        if start + page_size < len(files):
+            result['nextPageToken'] = str(start + page_size)
+        self._send_json(200, result)
+
+    def _files_create(self, url, params, body):
+        self._send_json(200, self.fake.add_file(json.loads(body or b'{}')))
+
+    def _upload_start_create(self, url, params, body):
+        self._start_session(json.loads(body or b'{}'), None)
+
+    def _upload_start_update(self, url, params, body):
+        file_id = url.path.rstrip('/').rsplit('/', 1)[-1]
+        if file_id not in self.fake.files:
+            raise KeyError(file_id)
+        self._start_session(json.loads(body or b'{}'), file_id)
+
+    def _start_session(self, metadata, file_id):
+        size = self.headers.get('X-Upload-Content-Length')
+        session_id = self.fake.open_session(metadata, int(size) if size else None, file_id)
+        self._send_json(200, {}, {'Location': f"{self.fake.base_url}/upload/session/{session_id}"})
+
+    def _upload_chunk(self, url, params, body):
+        session_id = url.path.rsplit('/', 1)[-1]
+        content_range = self.headers.get('Content-Range', '')
+        match = re.match(r'bytes (\*|(\d+)-(\d+))/(\*|\d+)', content_range)
+        start = int(match.group(2)) if match and match.group(2) else 0
+        total = int(match.group(4)) if match and match.group(4) != '*' else None
+        if match and match.group(1) == '*':
+            # Status query of an interrupted upload
+            body = b''
+            start = self.fake.session_offset(session_id)
+            if start is None:
+                raise KeyError(session_id)
+        completed = self.fake.write_chunk(session_id, start, body, total)
+        if completed is not None:
+            return self._send_json(200, completed)
+        offset = self.fake.session_offset(session_id)
+        headers = {'Range': f"bytes=0-{offset - 1}"} if offset else {}
+        self._send_json(308, None, headers)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
@@ -0,0 +1,64 @@
+"""
+Stand-in for `RevitServerTool createLocalRvt` used by the benchmarks.
+
+Accepts the same arguments the backup passes, sleeps for --latency seconds and writes
+--size bytes to the destination. The content depends only on the model path, --seed and,
+with --source, the model's last ModelHistory save, so repeated exports of an unchanged
+model are byte-identical and a new save changes the export.
+"""
+import argparse
+import hashlib
+import random
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from pathlib import Path
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command')
+    parser.add_argument('model_path')
+    parser.add_argument('-server', required=True)
+    parser.add_argument('-destination', required=True)
+    parser.add_argument('-overwrite', action='store_true')
+    parser.add_argument('--size', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source', help='Projects folder of the synthetic server.')
+    args = parser.parse_args(argv)
+    if args.command != 'createLocalRvt':
+        print(f"Unsupported command: {args.command}", file=sys.stderr)
+        return 2
+    destination = Path(args.destination)
+    if destination.exists() and not args.overwrite:
+        print(f"Destination exists: {destination}", file=sys.stderr)
+        return 1
+    time.sleep(args.latency)
+    last_save = last_history_time(args.source, args.model_path) if args.source else ''
+    key = f"{args.seed}:{args.model_path}:{last_save}"
+    seed = int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+    block = random.Random(seed).randbytes(min(BLOCK_SIZE, max(args.size, 1)))
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with open(destination, 'wb') as f:
+        remaining = args.size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+    return 0
+
+
+# noinspection SqlNoDataSourceInspection
+def last_history_time(source, model_path):
+    model_db = Path(source) / model_path / 'Data' / 'Model.db3'
+    if not model_db.exists():
+        return ''
+    with closing(sqlite3.connect(model_db)) as connection:
+        return connection.execute("SELECT MAX(Time) FROM ModelHistory").fetchone()[0] or ''
+
+
+if __name__ == '__main__':
+    sys.exit(main())
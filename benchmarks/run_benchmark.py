@@ -0,0 +1,145 @@
+"""
+Offline benchmark of BackupManager against a synthetic Revit Server, a stub
+RevitServerTool and a local Drive stand-in.
+
+For every model count it runs backup_all_models (cold), backup_all_models again
+(everything unchanged) and backup_edited_models after a share of the models
+was saved, and reports wall time, Drive API calls and peak memory of each run.
+
+Usage:
+python -m benchmarks.run_benchmark --models 10 100 1000 --export-size 1048576
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from google.auth.credentials import AnonymousCredentials
+
+from backup_manager.backup_manager import BackupManager, BackupConfig
+from benchmarks.fake_drive import FakeDrive
+from benchmarks.synthetic_server import generate_server, record_saves, write_fake_rstool
+from utils.gdrive import GoogleDriveClientPool
+
+
+def build_manager(workdir, source, rstool, drive, api_endpoint, args):
+    state = workdir / 'state'
+    config = BackupConfig(
+        source=str(source),
+        target=str(workdir / 'target'),
+        db_location=str(source / 'ModelLocationTable.db3'),
+        servername='BENCHMARK',
+        rstoollocation=rstool,
+        temp_folder=str(workdir / 'temp'),
+        root_folder_id=drive.root_id,
+        export_workers=args.export_workers,
+        upload_workers=args.upload_workers,
+        folder_cache_path=str(state / 'drive_folders.db3'),
+        upload_manifest_path=str(state / 'upload_manifest.db3'),
+        upload_chunk_size=args.chunk_size,
+        upload_session_path=str(state / 'upload_sessions.db3'),
+        model_state_path=str(state / 'model_state.db3'),
+        activity_db_path=str(state / 'model_activity.db3'),
+        history_path=str(state / 'backup_history.db3'),
+        run_journal_path=str(state / 'run_journal.db3'),
+        upload_mbit_per_second=args.upload_mbit,
+        archive_codec=args.archive_codec,
+        report_path=None,
+        metrics_path=None
+    )
+    manager = BackupManager(config)
+    manager.drive_pool = GoogleDriveClientPool(
+        folder_cache=manager.folder_cache,
+        metadata_index=manager.drive_index,
+        metrics=manager.metrics,
+        credentials=AnonymousCredentials(),
+        api_endpoint=api_endpoint,
+        rate_limiter=manager.drive_limiter,
+        bandwidth=manager.bandwidth
+    )
+    return manager
+
+
+def measure(name, drive, action, metrics=None):
+    calls_before = dict(drive.calls)
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    action()
+    wall_time = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = {endpoint: count - calls_before.get(endpoint, 0) for endpoint, count in drive.calls.items()}
+    calls = {endpoint: count for endpoint, count in calls.items() if count}
+    return {
+        'run': name,
+        'wall_seconds': round(wall_time, 3),
+        'api_calls': sum(count for endpoint, count in calls.items() if endpoint != 'injected_error'),
+        'api_calls_by_endpoint': calls,
+        'peak_python_memory_mb': round(peak / 1048576, 2),
+        'counters': metrics.counters() if metrics is not None else {}
+    }
+
+
+def run_scenario(model_count, args):
+    with tempfile.TemporaryDirectory(prefix='revit_backup_bench_') as folder:
+        workdir = Path(folder)
+        source = workdir / 'server'
+        model_paths = generate_server(source, model_count, model_size=args.export_size, seed=args.seed)
+        rstool = write_fake_rstool(workdir / 'tool', args.export_size, args.export_latency, source=source)
+        drive = FakeDrive(error_rate=args.error_rate, seed=args.seed)
+        api_endpoint = drive.start()
+        try:
+            manager = build_manager(workdir, source, rstool, drive, api_endpoint, args)
+            results = [
+                measure('backup_all_models (cold)', drive, manager.backup_all_models, manager.metrics),
+                measure('backup_all_models (unchanged)', drive, manager.backup_all_models, manager.metrics),
+            ]
+            edited = random.Random(args.seed).sample(model_paths, max(1, int(model_count * args.edit_fraction)))
+            record_saves(source, edited)
+            results.append(measure('backup_edited_models', drive, manager.backup_edited_models, manager.metrics))
+        finally:
+            drive.stop()
+        for result in results:
+            result['models'] = model_count
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--export-size', type=int, default=256 * 1024, help='Bytes written per export.')
+    parser.add_argument('--export-latency', type=float, default=0.0, help='Seconds each export takes.')
+    parser.add_argument('--export-workers', type=int, default=1)
+    parser.add_argument('--upload-workers', type=int, default=2)
+    parser.add_argument('--chunk-size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--edit-fraction', type=float, default=0.1, help='Share of models saved before the edited run.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of Drive requests answered with 429/5xx.')
+    parser.add_argument('--upload-mbit', type=float, default=0, help='Upload bandwidth cap in Mbit/s, 0 for none.')
+    parser.add_argument('--archive-codec', choices=('lzma', 'zstd'), help='Upload compressed archives.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Also write the results as JSON to this file.')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    results = []
+    for model_count in args.models:
+        results.extend(run_scenario(model_count, args))
+
+    print(f"{'models':>7}  {'run':<32}{'wall s':>9}{'API calls':>11}{'retries':>9}{'peak MB':>9}")
+    for result in results:
+        print(f"{result['models']:>7}  {result['run']:<32}{result['wall_seconds']:>9.2f}"
+              f"{result['api_calls']:>11}{result['counters'].get('drive_retries', 0):>9}"
+              f"{result['peak_python_memory_mb']:>9.2f}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import os
+import random
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%SZ'
+USERS = ('alice', 'bob', 'carol', 'dave', 'erin')
+
+
+# noinspection SqlNoDataSourceInspection
+def generate_server(root, model_count, models_per_project=5, model_size=0, recent_fraction=0.2, seed=0):
+    """
+    Generates a synthetic Revit Server projects tree:
+    a ModelLocationTable.db3 with ModelStorageTable, and for every model a
+    <model>/Data/Model.db3 with a ModelHistory of a few saves.
+
+    Parameters:
+    root (Path): The folder to create the tree in (the BackupConfig source).
+    model_count (int): Number of models.
+    models_per_project (int): Models per project folder.
+    model_size (int): Apparent on-disk size of each model folder in bytes, written as a sparse file
+    so export-size estimates see it without using the disk.
+    recent_fraction (float): Share of models whose last save is within the last 24 hours.
+    seed (int): Seed for the generated history.
+
+    Returns:
+    list: The generated model paths, as stored in ModelStorageTable.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    model_paths = []
+    for index in range(model_count):
+        project = f"Project_{index // models_per_project:04d}"
+        model_path = os.path.join(project, f"Model_{index:05d}.rvt")
+        data_folder = root / model_path / 'Data'
+        data_folder.mkdir(parents=True, exist_ok=True)
+        recent = rng.random() < recent_fraction
+        last_save = now - (timedelta(hours=rng.uniform(0, 20)) if recent else timedelta(days=rng.uniform(2, 90)))
+        history = []
+        for version in range(rng.randint(1, 8), 0, -1):
+            saved = last_save - timedelta(hours=version * rng.uniform(1, 48))
+            history.append((version, rng.choice(USERS), saved.strftime(DATETIME_FORMAT), ''))
+        history.append((len(history) + 1, rng.choice(USERS), last_save.strftime(DATETIME_FORMAT), ''))
+        with closing(sqlite3.connect(data_folder / 'Model.db3')) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ModelHistory (Version INTEGER, User TEXT, Time TEXT, Comment TEXT)")
+            connection.executemany("INSERT INTO ModelHistory VALUES (?, ?, ?, ?)", history)
+        if model_size:
+            with open(data_folder / 'ModelData.bin', 'wb') as f:
+                f.truncate(model_size)
+        model_paths.append(model_path)
+    with closing(sqlite3.connect(root / 'ModelLocationTable.db3')) as connection, connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS ModelStorageTable (ModelPath TEXT)")
+        connection.executemany("INSERT INTO ModelStorageTable VALUES (?)", [(path,) for path in model_paths])
+    return model_paths
+
+
+# noinspection SqlNoDataSourceInspection
+def record_saves(root, model_paths, user='alice'):
+    """
+    Appends a save at the current time to the ModelHistory of the given models.
+    """
+    saved = datetime.now(timezone.utc).strftime(DATETIME_FORMAT)
+    for model_path in model_paths:
+        with closing(sqlite3.connect(Path(root) / model_path / 'Data' / 'Model.db3')) as connection, connection:
+            version = connection.execute("SELECT COALESCE(MAX(Version), 0) + 1 FROM ModelHistory").fetchone()[0]
+            connection.execute("INSERT INTO ModelHistory VALUES (?, ?, ?, '')", (version, user, saved))
+
+
+def write_fake_rstool(folder, export_size, latency=0.0, content_seed=0, source=None):
+    """
+    Writes an executable stand-in for RevitServerTool that runs fake_rstool.py with the
+    given export size (bytes) and latency (seconds). With source, exports change whenever
+    the model gets a new save.
+
+    Returns:
+    str: The path to use as BackupConfig.rstoollocation.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    script = Path(__file__).with_name('fake_rstool.py').resolve()
+    arguments = f'"{sys.executable}" "{script}" --size {int(export_size)} --latency {latency} --seed {content_seed}'
+    if source:
+        arguments += f' --source "{Path(source).resolve()}"'
+    if os.name == 'nt':
+        launcher = folder / 'RevitServerTool.cmd'
+        launcher.write_text(f"@echo off\r\n{arguments} %*\r\n")
+    else:
+        launcher = folder / 'RevitServerTool'
+        launcher.write_text(f'#!/bin/sh\nexec {arguments} "$@"\n')
+        launcher.chmod(0o755)
+    return str(launcher)
@@ -1,38 +1,112 @@
+import argparse
 import logging
 import json
 from backup_manager.backup_manager import BackupManager, BackupConfig
 
-# Set up logging
-logging.basicConfig(filename='logs/revit_backup.log',
-                    level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    encoding='utf-8')
-
-# Load configuration from JSON file
-with open('config.json', 'r') as config_file:
-    config = json.load(config_file)
-
-# Create a BackupManager instance
-backup_config = BackupConfig(
-    source=config['source'],
-    target=config['target'],
-    db_location=config['db_location'],
-    servername=config['servername'],
-    rstoollocation=config['rstoollocation'],
-    temp_folder=config['temp_folder'],
-    root_folder_id=config['root_folder_id']
-)
-
-backup_manager = BackupManager(backup_config)
-
-# Usage Examples:
-#
-# All models
-#backup_manager.backup_all_models()
-#
-# Edited in 24 hours
-backup_manager.backup_edited_models()
-#
-# Specific model with the path to the model
-# specific_model = "4174_MAHDI_AMJAD’S_VILLA\\YDZ_4174_MAHDI AMJAD'S VILLA_new_spa.rvt"
-# backup_manager.backup_specific_model(specific_model)
\ No newline at end of file
+# Guarded, since worker processes (e.g. of the snapshot store) import this module again
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Back up Revit Server models.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and back up edited models shortly after their saves settle.')
+    parser.add_argument('--plan', action='store_true',
+                        help='Add the edited models to the shared work queue (work_queue_path) and exit.')
+    parser.add_argument('--work', action='store_true',
+                        help='Back up models claimed from the shared work queue until it is empty.')
+    parser.add_argument('--run-id',
+                        help='Journal ID of the run. An interrupted run with this ID resumes with its unfinished models.')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume the latest run that was interrupted, or start a new run if there is none.')
+    args = parser.parse_args()
+
+    # Set up logging
+    logging.basicConfig(filename='logs/revit_backup.log',
+                        level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s',
+                        encoding='utf-8')
+
+    # Load configuration from JSON file
+    with open('config.json', 'r') as config_file:
+        config = json.load(config_file)
+
+    # Create a BackupManager instance
+    backup_config = BackupConfig(
+        source=config['source'],
+        target=config['target'],
+        db_location=config['db_location'],
+        servername=config['servername'],
+        rstoollocation=config['rstoollocation'],
+        temp_folder=config['temp_folder'],
+        root_folder_id=config['root_folder_id'],
+        export_workers=config.get('export_workers', 1),
+        upload_workers=config.get('upload_workers', 2),
+        upload_queue_size=config.get('upload_queue_size', 2),
+        folder_cache_path=config.get('folder_cache_path', 'state/drive_folders.db3'),
+        skip_unchanged=config.get('skip_unchanged', True),
+        upload_manifest_path=config.get('upload_manifest_path', 'state/upload_manifest.db3'),
+        upload_chunk_size=config.get('upload_chunk_size', 32 * 1024 * 1024),
+        upload_session_path=config.get('upload_session_path', 'state/upload_sessions.db3'),
+        model_state_path=config.get('model_state_path', 'state/model_state.db3'),
+        scan_workers=config.get('scan_workers', 8),
+        scan_busy_timeout=config.get('scan_busy_timeout', 2.0),
+        temp_disk_budget=config.get('temp_disk_budget', 0),
+        report_path=config.get('report_path', 'logs/backup_report.json'),
+        metrics_path=config.get('metrics_path', 'logs/revit_backup.prom'),
+        snapshot_target=config.get('snapshot_target', False),
+        snapshot_chunk_size=config.get('snapshot_chunk_size', 1024 * 1024),
+        watch_poll_interval=config.get('watch_poll_interval', 60.0),
+        watch_settle_seconds=config.get('watch_settle_seconds', 300.0),
+        watch_max_delay=config.get('watch_max_delay', 3600.0),
+        watch_max_exports_per_hour=config.get('watch_max_exports_per_hour', 0),
+        drive_requests_per_second=config.get('drive_requests_per_second', 10.0),
+        drive_burst=config.get('drive_burst', 20),
+        drive_max_retries=config.get('drive_max_retries', 6),
+        activity_db_path=config.get('activity_db_path', 'state/model_activity.db3'),
+        work_queue_path=config.get('work_queue_path'),
+        work_lease_seconds=config.get('work_lease_seconds', 300.0),
+        work_max_attempts=config.get('work_max_attempts', 3),
+        history_path=config.get('history_path', 'state/backup_history.db3'),
+        backup_window_end=config.get('backup_window_end'),
+        backup_window_start=config.get('backup_window_start'),
+        upload_mbit_per_second=config.get('upload_mbit_per_second', 0),
+        upload_bandwidth_schedule=config.get('upload_bandwidth_schedule'),
+        run_journal_path=config.get('run_journal_path', 'state/run_journal.db3'),
+        archive_codec=config.get('archive_codec'),
+        archive_projects=config.get('archive_projects'),
+        archive_level=config.get('archive_level'),
+        archive_threads=config.get('archive_threads', 0),
+        archive_block_size=config.get('archive_block_size', 16 * 1024 * 1024)
+    )
+
+    backup_manager = BackupManager(backup_config)
+
+    run_id = args.run_id
+    if args.resume and run_id is None and backup_manager.run_journal is not None:
+        run_id = backup_manager.run_journal.latest_unfinished('edited')
+
+    if args.plan or args.work:
+        if args.plan:
+            backup_manager.enqueue_models()
+        if args.work:
+            backup_manager.backup_queued_models()
+            backup_manager.write_run_report()
+        raise SystemExit(0)
+
+    if args.watch:
+        # Runs until interrupted, writing the run report after every batch of backups
+        backup_manager.watch_edited_models()
+        raise SystemExit(0)
+
+    # Usage Examples:
+    #
+    # All models
+    #backup_manager.backup_all_models(run_id=run_id)
+    #
+    # Edited since the last successful backup
+    backup_manager.backup_edited_models(run_id=run_id)
+    #
+    # Specific model with the path to the model
+    # specific_model = "4174_MAHDI_AMJAD’S_VILLA\\YDZ_4174_MAHDI AMJAD'S VILLA_new_spa.rvt"
+    # backup_manager.backup_specific_model(specific_model, run_id=run_id)
+
+    # Per-stage timings, throughput and model outcomes of this run
+    backup_manager.write_run_report()
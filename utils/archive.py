@@ -0,0 +1,271 @@
+"""
+Block-parallel compressed archives of exported models.
+
+An archive is a sequence of independently compressed blocks: concatenated .xz
+streams for lzma, or concatenated zstd frames, so `xz -d` and `zstd -d` restore it
+as well as this module.
+
+Usage:
+python -m utils.archive restore <archive> <output> [--size BYTES] [--md5 HEX]
+"""
+import argparse
+import hashlib
+import logging
+import lzma
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+try:
+    import zstandard
+except ImportError:  # Optional: without it, archives use lzma
+    zstandard = None
+
+SUFFIXES = {'lzma': '.xz', 'zstd': '.zst'}
+MAGIC = {'lzma': b'\xfd7zXZ\x00', 'zstd': b'\x28\xb5\x2f\xfd'}
+DEFAULT_LEVELS = {'lzma': 6, 'zstd': 3}
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+
+class ArchiveVerificationError(Exception):
+    """
+    Raised when a restored file does not match the original's recorded size or MD5.
+    """
+
+
+@dataclass
+class ArchiveResult:
+    path: str
+    codec: str
+    original_size: int
+    original_md5: str
+    compressed_size: int
+    cpu_seconds: float
+
+    @property
+    def ratio(self):
+        return self.original_size / self.compressed_size if self.compressed_size else 0.0
+
+    def app_properties(self):
+        """
+        Returns:
+        dict: The original's size and MD5 as Drive appProperties of the archive.
+        """
+        return {'archiveCodec': self.codec, 'originalSize': str(self.original_size), 'originalMd5': self.original_md5}
+
+
+def resolve_codec(codec):
+    """
+    Returns the codec to use for the configured one: zstd falls back to lzma when zstandard is not installed.
+    """
+    if codec not in SUFFIXES:
+        raise ValueError(f"Unknown archive codec '{codec}', expected one of {', '.join(SUFFIXES)}")
+    if codec == 'zstd' and zstandard is None:
+        logging.warning("Archive codec 'zstd' needs the zstandard package, using lzma instead")
+        return 'lzma'
+    return codec
+
+
+def _block_compressor(codec, level):
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    if codec == 'lzma':
+        def compress(block):
+            start = time.thread_time()
+            return lzma.compress(block, format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC64, preset=level), \
+                time.thread_time() - start
+        return compress
+    local = threading.local()
+
+    def compress(block):
+        start = time.thread_time()
+        # ZstdCompressor objects must not be shared between threads
+        compressor = getattr(local, 'compressor', None)
+        if compressor is None:
+            compressor = local.compressor = zstandard.ZstdCompressor(level=level, write_checksum=True)
+        return compressor.compress(block), time.thread_time() - start
+    return compress
+
+
+def compress_file(source_path, archive_path, codec='lzma', level=None, block_size=DEFAULT_BLOCK_SIZE,
+                  threads=None, executor=None):
+    """
+    Compresses a file block by block on a thread pool while it is read once, writing the
+    blocks in order. At most two blocks per worker are in memory at a time.
+
+    Parameters:
+    source_path (str): The file to compress.
+    archive_path (str): Where to write the archive.
+    codec (str): 'lzma' or 'zstd'.
+    level (int): Compression level (lzma preset or zstd level). Defaults to the codec's default.
+    block_size (int): Bytes compressed per block. Larger blocks compress better, smaller ones use less memory.
+    threads (int): Blocks compressed at once. Defaults to one per CPU.
+    executor (ThreadPoolExecutor): Optionally, a shared pool of that many threads to compress on.
+
+    Returns:
+    ArchiveResult: Sizes, the original's MD5 and the CPU time spent compressing.
+    """
+    compress = _block_compressor(codec, level)
+    threads = threads or os.cpu_count() or 1
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='compress')
+    max_pending = 2 * threads
+    digest = hashlib.md5()
+    original_size = compressed_size = 0
+    cpu_seconds = 0.0
+    pending = deque()
+    try:
+        with open(source_path, 'rb') as source, open(archive_path, 'wb') as archive:
+            def write_oldest():
+                nonlocal compressed_size, cpu_seconds
+                data, seconds = pending.popleft().result()
+                archive.write(data)
+                compressed_size += len(data)
+                cpu_seconds += seconds
+
+            while True:
+                block = source.read(block_size)
+                if not block and original_size:
+                    break
+                digest.update(block)
+                original_size += len(block)
+                pending.append(executor.submit(compress, block))
+                if len(pending) >= max_pending:
+                    write_oldest()
+                if not block:
+                    break  # An empty file still gets one (empty) block
+            while pending:
+                write_oldest()
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return ArchiveResult(str(archive_path), codec, original_size, digest.hexdigest(), compressed_size, cpu_seconds)
+
+
+def detect_codec(header):
+    """
+    Returns the codec of an archive from its first bytes, or None.
+    """
+    for codec, magic in MAGIC.items():
+        if header.startswith(magic):
+            return codec
+    return None
+
+
+class ArchiveRestorer:
+    """
+    Writable stream that decompresses the archive bytes written to it into output,
+    across block boundaries, and hashes what it restores. Data can be written in
+    pieces of any size, e.g. straight from a download.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.codec = None
+        self.size = 0
+        self._digest = hashlib.md5()
+        self._decompressor = None
+        self._header = b''
+
+    def write(self, data):
+        written = len(data)
+        if self.codec is None:
+            self._header += data
+            if len(self._header) < max(len(magic) for magic in MAGIC.values()):
+                return written
+            self.codec = detect_codec(self._header)
+            if self.codec is None:
+                raise ValueError("Not an lzma or zstd archive")
+            if self.codec == 'zstd' and zstandard is None:
+                raise RuntimeError("Restoring a zstd archive needs the zstandard package")
+            data, self._header = self._header, b''
+        while data:
+            if self._decompressor is None:
+                self._decompressor = (lzma.LZMADecompressor(format=lzma.FORMAT_XZ) if self.codec == 'lzma'
+                                      else zstandard.ZstdDecompressor().decompressobj())
+            restored = self._decompressor.decompress(data)
+            self.output.write(restored)
+            self._digest.update(restored)
+            self.size += len(restored)
+            if not self._decompressor.eof:
+                break
+            # The block ended: the rest belongs to the next block
+            data = self._decompressor.unused_data
+            self._decompressor = None
+        return written
+
+    def close(self):
+        """
+        Raises:
+        ValueError: If the archive ended inside a block.
+        """
+        if self._header:
+            raise ValueError("Archive is truncated")
+        if self._decompressor is not None and not self._decompressor.eof:
+            raise ValueError("Archive is truncated")
+
+    def md5(self):
+        return self._digest.hexdigest()
+
+
+def restore_file(archive_path, output_path, original_size=None, original_md5=None):
+    """
+    Decompresses an archive into output_path as a stream and checks the result.
+
+    Parameters:
+    original_size (int): Optionally, the recorded size of the original.
+    original_md5 (str): Optionally, the recorded MD5 of the original.
+
+    Returns:
+    tuple: The restored size and MD5.
+
+    Raises:
+    ArchiveVerificationError: If the restored file does not match the recorded size or MD5.
+    """
+    with open(archive_path, 'rb') as archive, open(output_path, 'wb') as output:
+        restorer = ArchiveRestorer(output)
+        while True:
+            data = archive.read(READ_SIZE)
+            if not data:
+                break
+            restorer.write(data)
+        restorer.close()
+    if original_size is not None and restorer.size != int(original_size):
+        raise ArchiveVerificationError(
+            f"Restored {restorer.size} bytes from '{archive_path}', the original had {original_size}")
+    if original_md5 is not None and restorer.md5() != original_md5.lower():
+        raise ArchiveVerificationError(
+            f"Restored file from '{archive_path}' has md5 {restorer.md5()}, the original had {original_md5}")
+    return restorer.size, restorer.md5()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    restore_parser = commands.add_parser('restore', help='Decompress an archive and check it against the original.')
+    restore_parser.add_argument('archive')
+    restore_parser.add_argument('output')
+    restore_parser.add_argument('--size', type=int, help="The original's size (Drive appProperties originalSize).")
+    restore_parser.add_argument('--md5', help="The original's MD5 (Drive appProperties originalMd5).")
+    args = parser.parse_args(argv)
+
+    try:
+        size, md5 = restore_file(args.archive, args.output, args.size, args.md5)
+    except Exception as e:
+        print(f"Restore failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Restored {size} bytes (md5 {md5}) to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
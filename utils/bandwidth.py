@@ -0,0 +1,161 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+BYTES_PER_MBIT = 125000
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+def _minutes(time_of_day):
+    hour, minute = (int(part) for part in time_of_day.split(':'))
+    return hour * 60 + minute
+
+
+@dataclass
+class BandwidthWindow:
+    start: int
+    end: int
+    bytes_per_second: float
+    days: frozenset
+
+    def contains(self, moment):
+        minute = moment.hour * 60 + moment.minute
+        if self.start <= self.end:
+            return moment.weekday() in self.days and self.start <= minute < self.end
+        # The window runs past midnight: its early hours belong to the previous day's window
+        return ((moment.weekday() in self.days and minute >= self.start)
+                or ((moment - timedelta(days=1)).weekday() in self.days and minute < self.end))
+
+
+class BandwidthSchedule:
+    """
+    Upload bandwidth cap by local time of day and weekday. The first window containing
+    a moment sets its cap; outside every window the default applies. A cap of 0 is unlimited.
+    """
+
+    def __init__(self, default_bytes_per_second=0, windows=()):
+        self.default_bytes_per_second = default_bytes_per_second or 0
+        self.windows = list(windows)
+
+    @classmethod
+    def from_config(cls, mbit_per_second=0, rules=None):
+        """
+        Parameters:
+        mbit_per_second (float): Cap outside the windows in Mbit/s, 0 for unlimited.
+        rules (list): Windows as dicts with 'start' and 'end' ('HH:MM', local time), 'mbit_per_second'
+            and optionally 'days' (e.g. ["mon", "tue", "wed", "thu", "fri"], default every day).
+        """
+        windows = []
+        for rule in rules or ():
+            days = [WEEKDAYS.index(day.lower()[:3]) for day in rule.get('days', WEEKDAYS)]
+            windows.append(BandwidthWindow(_minutes(rule['start']), _minutes(rule['end']),
+                                           (rule.get('mbit_per_second') or 0) * BYTES_PER_MBIT, frozenset(days)))
+        return cls((mbit_per_second or 0) * BYTES_PER_MBIT, windows)
+
+    def rate_at(self, timestamp=None):
+        """
+        Returns:
+        float: The cap in bytes per second at the given time, 0 for unlimited.
+        """
+        moment = datetime.fromtimestamp(time.time() if timestamp is None else timestamp)
+        for window in self.windows:
+            if window.contains(moment):
+                return window.bytes_per_second
+        return self.default_bytes_per_second
+
+    def __bool__(self):
+        return bool(self.default_bytes_per_second or any(window.bytes_per_second for window in self.windows))
+
+
+class BandwidthGovernor:
+    """
+    Paces the upload chunks of every concurrent upload of a process to the scheduled cap.
+
+    Each chunk reserves the next free slot of a shared transmit timeline, size / cap
+    seconds long, and is sent once its slot starts, so the uploads together average at
+    most the cap; within a chunk the data goes out at link speed, so smaller chunks
+    give smoother traffic. While uploads are in flight under a cap, the governor
+    counts the bytes sent, the capped seconds and the bytes the cap allowed in them,
+    for comparing achieved with allowed throughput. Thread-safe.
+    """
+
+    def __init__(self, schedule, metrics=None):
+        """
+        Parameters:
+        schedule (BandwidthSchedule): The cap over the day.
+        metrics (RunMetrics): Optionally, counts capped bytes and seconds, allowed bytes and time spent waiting.
+        """
+        self.schedule = schedule
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._next_free = 0.0
+        self._in_flight = 0
+        self._rate = 0.0
+        self._ticked = time.monotonic()
+
+    @contextmanager
+    def transfer(self, bytes_count):
+        """
+        Waits until bytes_count bytes may be sent, then runs the block that sends them. Under
+        a cap, the block is held until its slot ends, so a chunk sent faster than the cap
+        still counts its full slot as capped time.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tick(now)
+            self._in_flight += 1
+            if self._rate:
+                start = max(now, self._next_free)
+                self._next_free = start + bytes_count / self._rate
+                self._count('upload_capped_bytes', bytes_count)
+            else:
+                start = self._next_free = now
+            end = self._next_free
+        try:
+            self._wait_until(start)
+            yield
+            self._wait_until(end)
+        finally:
+            with self._lock:
+                self._tick(time.monotonic())
+                self._in_flight -= 1
+
+    def _wait_until(self, moment):
+        delay = moment - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            self._count('upload_bandwidth_wait_seconds', delay)
+
+    def _tick(self, now):
+        # Integrates the cap over the time uploads were in flight, then picks up schedule changes
+        if self._in_flight and self._rate:
+            elapsed = now - self._ticked
+            self._count('upload_capped_seconds', elapsed)
+            self._count('upload_allowed_bytes', elapsed * self._rate)
+        self._ticked = now
+        self._rate = self.schedule.rate_at()
+
+    def _count(self, name, amount):
+        if self.metrics is not None:
+            self.metrics.count(name, amount)
+
+
+def bandwidth_report(counters):
+    """
+    Returns:
+    dict: Achieved and allowed upload Mbit/s while a cap applied, from a run's counters, or None without capped uploads.
+    """
+    seconds = counters.get('upload_capped_seconds')
+    if not seconds:
+        return None
+    achieved = counters.get('upload_capped_bytes', 0) / seconds / BYTES_PER_MBIT
+    allowed = counters.get('upload_allowed_bytes', 0) / seconds / BYTES_PER_MBIT
+    return {
+        'capped_seconds': round(seconds, 3),
+        'achieved_mbit_per_second': round(achieved, 3),
+        'allowed_mbit_per_second': round(allowed, 3),
+        'utilization': round(achieved / allowed, 3) if allowed else None,
+        'wait_seconds': counters.get('upload_bandwidth_wait_seconds', 0)
+    }
@@ -0,0 +1,66 @@
+import threading
+
+from utils.gdrive import FOLDER_MIME_TYPE
+
+
+class DriveMetadataIndex:
+    """
+    In-memory index of the children of prefetched Drive folders.
+
+    Filled by GoogleDriveAPI.prefetch_children with a few paginated listings per run,
+    it answers find_file and folder existence checks for those folders without an
+    API call. Uploads and folder creations keep it current. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexed_folders = set()
+        self._files = {}
+        self._folders = {}
+
+    def clear(self):
+        with self._lock:
+            self._indexed_folders.clear()
+            self._files.clear()
+            self._folders.clear()
+
+    def mark_indexed(self, folder_ids):
+        """
+        Declares folders as fully listed: a name missing from them means it does not exist.
+        """
+        with self._lock:
+            self._indexed_folders.update(folder_ids)
+
+    def is_indexed(self, folder_id):
+        with self._lock:
+            return folder_id in self._indexed_folders
+
+    def add(self, parent_id, metadata):
+        """
+        Adds or replaces a child of parent_id. The first entry wins for duplicate names,
+        matching the first-result behaviour of the per-name queries.
+        """
+        entries = self._folders if metadata.get('mimeType') == FOLDER_MIME_TYPE else self._files
+        key = (parent_id, metadata['name'])
+        with self._lock:
+            current = entries.get(key)
+            if current is None or current['id'] == metadata['id']:
+                entries[key] = dict(metadata)
+
+    def find_file(self, parent_id, name):
+        with self._lock:
+            return self._files.get((parent_id, name))
+
+    def find_folder(self, parent_id, name):
+        with self._lock:
+            return self._folders.get((parent_id, name))
+
+    def forget_folder(self, folder_id):
+        """
+        Drops a folder's listing, e.g. after Drive reported it missing.
+        """
+        with self._lock:
+            self._indexed_folders.discard(folder_id)
+            for entries in (self._files, self._folders):
+                for key in [key for key in entries if key[0] == folder_id]:
+                    del entries[key]
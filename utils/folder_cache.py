@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+
+def normalize_folder_path(path):
+    """
+    Normalizes a relative Drive folder path to 'a/b/c' form.
+    Backslashes are treated as separators and '.' or '' mean the root itself.
+    """
+    parts = [part for part in str(path or '').replace('\\', '/').split('/') if part and part != '.']
+    return '/'.join(parts)
+
+
+# noinspection SqlNoDataSourceInspection
+class DriveFolderCache:
+    """
+    Folder-ID cache keyed by (root_folder_id, relative path).
+
+    Lookups are answered from memory; every change is written through to a small
+    SQLite file so the next run starts warm. Thread-safe.
+    """
+    CREATE_QUERY = (
+        "CREATE TABLE IF NOT EXISTS DriveFolders ("
+        "RootId TEXT NOT NULL, Path TEXT NOT NULL, FolderId TEXT NOT NULL, "
+        "PRIMARY KEY (RootId, Path))"
+    )
+
+    def __init__(self, db_path=None):
+        """
+        Parameters:
+        db_path (str): Path of the SQLite file. When None the cache only lives in memory.
+        """
+        self._lock = threading.Lock()
+        self._folders = {}
+        self._connection = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(db_path), check_same_thread=False)
+            with self._connection:
+                self._connection.execute(self.CREATE_QUERY)
+            for root_id, path, folder_id in self._connection.execute(
+                    "SELECT RootId, Path, FolderId FROM DriveFolders"):
+                self._folders[(root_id, path)] = folder_id
+
+    def get(self, root_folder_id, path):
+        with self._lock:
+            return self._folders.get((root_folder_id or '', normalize_folder_path(path)))
+
+    def set(self, root_folder_id, path, folder_id):
+        self.update(root_folder_id, {path: folder_id})
+
+    def update(self, root_folder_id, folders):
+        """
+        Stores several folders of one root at once.
+
+        Parameters:
+        root_folder_id (str): The Drive folder the paths are relative to.
+        folders (dict): Relative path -> folder ID.
+        """
+        rows = [(root_folder_id or '', normalize_folder_path(path), folder_id) for path, folder_id in folders.items()]
+        with self._lock:
+            for root_id, path, folder_id in rows:
+                self._folders[(root_id, path)] = folder_id
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO DriveFolders (RootId, Path, FolderId) VALUES (?, ?, ?)", rows)
+
+    def invalidate(self, root_folder_id, path):
+        """
+        Drops a cached folder together with everything cached below it.
+        """
+        root_id = root_folder_id or ''
+        path = normalize_folder_path(path)
+        prefix = path + '/'
+        with self._lock:
+            stale = [key for key in self._folders
+                     if key[0] == root_id and (not path or key[1] == path or key[1].startswith(prefix))]
+            for key in stale:
+                del self._folders[key]
+            if self._connection is not None and stale:
+                with self._connection:
+                    self._connection.executemany(
+                        "DELETE FROM DriveFolders WHERE RootId = ? AND Path = ?", stale)
+
+    def has_root(self, root_folder_id):
+        root_id = root_folder_id or ''
+        with self._lock:
+            return any(key[0] == root_id for key in self._folders)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
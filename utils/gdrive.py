@@ -1,84 +1,435 @@
 import os
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import json
+import hashlib
+import logging
+import threading
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path, PurePath
+from utils.folder_cache import normalize_folder_path
+from utils.rate_limiter import http_status
+from utils.upload_sessions import UploadSessionStore
+
+# The Google client libraries take a large share of startup time and are imported
+# only once a Drive client is actually built, so runs with nothing to upload skip them.
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FILE_FIELDS = 'id, name, md5Checksum, size, appProperties'
+LISTING_FIELDS = 'id, name, mimeType, parents, md5Checksum, size, modifiedTime, appProperties'
+# Parent IDs per listing query, keeps the query string well below Drive's length limit
+PREFETCH_BATCH_SIZE = 40
+# Resumable chunks must be a multiple of 256 KiB
+CHUNK_SIZE_UNIT = 256 * 1024
+DEFAULT_CHUNK_SIZE = 32 * 1024 * 1024
+
+
+def file_md5(file_path, block_size=1024 * 1024):
+    """
+    Returns the hex MD5 of a file, read in blocks so memory stays flat for large models.
+    """
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadVerificationError(Exception):
+    """
+    Raised when the checksum or size Drive reports for an upload differs from what was sent.
+    """
+
+
+def is_not_found_error(error):
+    """
+    Returns True if the error is a Drive API 404 response.
+    """
+    return http_status(error) == 404
+
+
+@lru_cache(maxsize=None)
+def _discovery_document(root_url=None):
+    """
+    Returns the Drive v3 discovery document bundled with googleapiclient as JSON text,
+    read once per process, or None if this googleapiclient does not bundle it. A root_url
+    points every URL, uploads included, at another host such as a local Drive stand-in.
+    Building a client from it skips build()'s discovery lookup and cache handling.
+    """
+    from googleapiclient.discovery_cache import get_static_doc
+    document = get_static_doc('drive', 'v3')
+    if document is None or not root_url:
+        return document
+    document = json.loads(document)
+    document['rootUrl'] = root_url
+    return json.dumps(document)
+
+
+def _default_paths(cred_path, token_path):
+    base_dir = Path(__file__).parent.parent
+    return str(cred_path or (base_dir / 'credentials.json')), str(token_path or (base_dir / 'token.json'))
+
+
+def load_credentials(cred_path, token_path):
+    """
+    Loads the stored token, refreshing it or running the consent flow when needed,
+    and writes the resulting token back to token_path.
+    """
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    creds = None
+    if os.path.exists(token_path):
+        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(cred_path, SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open(token_path, 'w') as token:
+            token.write(creds.to_json())
+    return creds
 
 
 class GoogleDriveAPI:
-    def __init__(self, cred_path=None, token_path=None):
-        base_dir = Path(__file__).parent.parent
-        self.cred_path = str(cred_path or (base_dir / 'credentials.json'))
-        self.token_path = str(token_path or (base_dir / 'token.json'))
-        self.creds = None
+    def __init__(
+            self,
+            cred_path=None,
+            token_path=None,
+            folder_cache=None,
+            credentials=None,
+            metadata_index=None,
+            metrics=None,
+            api_endpoint=None,
+            rate_limiter=None,
+            bandwidth=None,
+            folder_lock=None
+    ):
+        self.cred_path, self.token_path = _default_paths(cred_path, token_path)
+        self.folder_cache = folder_cache
+        self.metadata_index = metadata_index
+        self.metrics = metrics
+        self.api_endpoint = api_endpoint
+        self.rate_limiter = rate_limiter
+        self.bandwidth = bandwidth
+        # Shared by clients that upload to the same folders, so two of them never create the same folder
+        self.folder_lock = folder_lock or threading.Lock()
+        self.creds = credentials
         self.service = self._authorize()
 
+    def _measure(self, stage, bytes_count=0):
+        return self.metrics.stage(stage, bytes_count) if self.metrics is not None else nullcontext()
+
+    def _execute(self, request):
+        # Every API call goes through the shared rate limiter, which also retries transient errors
+        return self.rate_limiter.execute(request) if self.rate_limiter is not None else request.execute()
+
     def _authorize(self):
-        if os.path.exists(self.token_path):
-            self.creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(self.cred_path, SCOPES)
-                self.creds = flow.run_local_server(port=0)
-            with open(self.token_path, 'w') as token:
-                token.write(self.creds.to_json())
-        return build('drive', 'v3', credentials=self.creds)
+        if self.creds is None:
+            self.creds = load_credentials(self.cred_path, self.token_path)
+        from googleapiclient.discovery import build, build_from_document
+        document = _discovery_document(self.api_endpoint)
+        if document is None:
+            return build('drive', 'v3', credentials=self.creds)
+        return build_from_document(document, credentials=self.creds)
 
-    def upload_file(self, file_path, folder_id=None, overwrite=True, drive_filename=None):
+    def upload_file(
+            self,
+            file_path,
+            folder_id=None,
+            overwrite=True,
+            drive_filename=None,
+            existing=None,
+            chunk_size=DEFAULT_CHUNK_SIZE,
+            session_store=None,
+            progress_callback=None,
+            app_properties=None
+    ):
+        """
+        Uploads a file in resumable chunks, updating the file with the same name in
+        folder_id when overwrite is set.
+
+        :param existing: Metadata of the file to overwrite (as returned by find_file), saves the lookup.
+        :param chunk_size: Bytes per chunk, rounded to a multiple of 256 KiB. Bounds memory per upload.
+        :param session_store: Optionally, an UploadSessionStore. The session URI and committed offset
+            are saved after every chunk, and a saved session is resumed instead of starting over.
+        :param progress_callback: Optionally, called with (bytes_sent, total_bytes) after every chunk.
+        :param app_properties: Optionally, Drive appProperties to set on the file.
+        :return: The uploaded file's metadata (id, name, md5Checksum, size), checked against the
+            MD5 and size of the bytes read for the upload.
+        :raises UploadVerificationError: If Drive reports a different checksum or size.
+        """
         filename = drive_filename if drive_filename else os.path.basename(file_path)
         file_metadata = {'name': filename}
         if folder_id:
             file_metadata['parents'] = [folder_id]
-        media = MediaFileUpload(file_path, resumable=True)
+        if app_properties:
+            file_metadata['appProperties'] = app_properties
+        chunk_size = max(CHUNK_SIZE_UNIT, int(chunk_size) // CHUNK_SIZE_UNIT * CHUNK_SIZE_UNIT)
+        from utils.media_upload import HashingMediaUpload
+        media = HashingMediaUpload(file_path, chunksize=chunk_size, resumable=True)
         # Overwrite if exists
         if overwrite and folder_id:
-            existing = self.find_file(filename, folder_id)
+            if existing is None:
+                existing = self.find_file(filename, folder_id)
             if existing:
                 file_id = existing['id']
-                updated = self.service.files().update(fileId=file_id, media_body=media).execute()
+                body = {'appProperties': app_properties} if app_properties else None
+                request = self.service.files().update(
+                    fileId=file_id, body=body, media_body=media, fields=FILE_FIELDS)
+                session_key = UploadSessionStore.make_key(file_path, folder_id, filename, file_id)
+                with self._measure('upload', os.path.getsize(file_path)):
+                    updated = self._upload_in_chunks(request, session_key, session_store, progress_callback)
+                self._verify_upload(filename, media, updated)
+                self._index_uploaded(folder_id, updated)
                 print(f"File '{filename}' updated in Google Drive.")
-                return updated.get('id')
-        file = self.service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+                return updated
+        request = self.service.files().create(body=file_metadata, media_body=media, fields=FILE_FIELDS)
+        session_key = UploadSessionStore.make_key(file_path, folder_id, filename)
+        with self._measure('upload', os.path.getsize(file_path)):
+            file = self._upload_in_chunks(request, session_key, session_store, progress_callback)
+        self._verify_upload(filename, media, file)
+        self._index_uploaded(folder_id, file)
         print(f"File '{filename}' uploaded to Google Drive.")
-        return file.get('id')
+        return file
+
+    def _verify_upload(self, filename, media, metadata):
+        with self._measure('verify', media.size()):
+            local_md5 = media.md5()
+            remote_size = metadata.get('size')
+            if metadata.get('md5Checksum') != local_md5 or remote_size is None or int(remote_size) != media.size():
+                raise UploadVerificationError(
+                    f"Upload of '{filename}' does not match the local file: Drive reports md5 "
+                    f"{metadata.get('md5Checksum')} and {remote_size} bytes, sent {local_md5} and {media.size()} bytes")
+
+    def _upload_in_chunks(self, request, session_key, session_store, progress_callback):
+        resumed = session_store.get(session_key) if session_store else None
+        if resumed:
+            request.resumable_uri, request.resumable_progress = resumed
+            # Makes next_chunk ask Drive for the committed offset before sending data
+            request._in_error_state = True
+        response = None
+        while response is None:
+            try:
+                if self.rate_limiter is not None:
+                    status, response = self.rate_limiter.call(self._next_chunk, request)
+                else:
+                    status, response = self._next_chunk(request)
+            except Exception as e:
+                if resumed and http_status(e) in (404, 410):
+                    # The saved session expired: start a new one from byte zero
+                    logging.warning(f"Resumable upload session expired, restarting upload: {e}")
+                    session_store.delete(session_key)
+                    resumed = None
+                    request.resumable_uri = None
+                    request.resumable_progress = 0
+                    request._in_error_state = False
+                    continue
+                raise
+            if response is None and session_store:
+                session_store.save(session_key, request.resumable_uri, request.resumable_progress)
+            if progress_callback:
+                total = request.resumable.size()
+                progress_callback(total if response is not None else request.resumable_progress, total)
+        if session_store:
+            session_store.delete(session_key)
+        return response
+
+    def _next_chunk(self, request):
+        if self.bandwidth is None:
+            return request.next_chunk()
+        # Retried chunks are paced too, since they are sent again
+        remaining = request.resumable.size() - request.resumable_progress
+        with self.bandwidth.transfer(min(request.resumable.chunksize(), remaining)):
+            return request.next_chunk()
+
+    def _index_uploaded(self, folder_id, metadata):
+        if self.metadata_index is not None and folder_id and metadata and 'name' in metadata:
+            self.metadata_index.add(folder_id, metadata)
 
     def find_file(self, filename, folder_id):
-        safe_filename = self.escape_drive_query_value(filename)
-        # Looks for an existing file by name in the specified folder
-        query = f"name='{safe_filename}' and '{folder_id}' in parents and trashed=false"
-        results = self.service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
-        files = results.get('files', [])
-        return files[0] if files else None
+        with self._measure('find_file'):
+            if self.metadata_index is not None and self.metadata_index.is_indexed(folder_id):
+                return self.metadata_index.find_file(folder_id, filename)
+            safe_filename = self.escape_drive_query_value(filename)
+            # Looks for an existing file by name in the specified folder
+            query = f"name='{safe_filename}' and '{folder_id}' in parents and trashed=false"
+            results = self._execute(self.service.files().list(q=query, spaces='drive', fields=f'files({FILE_FIELDS})'))
+            files = results.get('files', [])
+            return files[0] if files else None
 
     def get_or_create_folder(self, path, root_folder_id=None):
-        parts = path.strip('/').split('/')
+        """
+        Returns the ID of the folder at path below root_folder_id, creating missing folders.
+        With a folder cache, only the segments below the deepest cached folder cost API calls.
+        A cached chain that Drive no longer knows (404) is dropped and resolved again.
+        """
+        with self._measure('folder'), self.folder_lock:
+            try:
+                return self._resolve_folder(path, root_folder_id)
+            except Exception as e:
+                if self.folder_cache is None or not is_not_found_error(e):
+                    raise
+                self.invalidate_folder(path, root_folder_id)
+                return self._resolve_folder(path, root_folder_id)
+
+    def find_folder(self, path, root_folder_id=None):
+        """
+        Returns the ID of the folder at path below root_folder_id, or None if it does not exist.
+        Unlike get_or_create_folder, nothing is created.
+        """
+        with self._measure('folder'):
+            try:
+                return self._resolve_folder(path, root_folder_id, create=False)
+            except Exception as e:
+                if self.folder_cache is None or not is_not_found_error(e):
+                    raise
+                self.invalidate_folder(path, root_folder_id)
+                return self._resolve_folder(path, root_folder_id, create=False)
+
+    def _resolve_folder(self, path, root_folder_id, create=True):
+        normalized = normalize_folder_path(path)
+        parts = normalized.split('/') if normalized else []
         parent_id = root_folder_id
-        for part in parts:
+        start = 0
+        if self.folder_cache is not None:
+            for depth in range(len(parts), 0, -1):
+                cached_id = self.folder_cache.get(root_folder_id, '/'.join(parts[:depth]))
+                if cached_id:
+                    parent_id, start = cached_id, depth
+                    break
+        resolved = {}
+        for depth in range(start, len(parts)):
+            part = parts[depth]
+            if self.metadata_index is not None and self.metadata_index.is_indexed(parent_id):
+                known = self.metadata_index.find_folder(parent_id, part)
+                if known is None:
+                    if not create:
+                        parent_id = None
+                        break
+                    known = self._create_folder(part, parent_id)
+                parent_id = known['id']
+                resolved['/'.join(parts[:depth + 1])] = parent_id
+                continue
             safe_part = self.escape_drive_query_value(part)
             query = (
-                f"mimeType='application/vnd.google-apps.folder' "
+                f"mimeType='{FOLDER_MIME_TYPE}' "
                 f"and trashed=false "
                 f"and name='{safe_part}' "
                 f"and '{parent_id}' in parents"
             )
-            results = self.service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
+            results = self._execute(self.service.files().list(q=query, spaces='drive', fields='files(id, name)'))
             files = results.get('files', [])
             if files:
                 parent_id = files[0]['id']
+            elif not create:
+                parent_id = None
+                break
             else:
-                metadata = {'name': safe_part, 'mimeType': 'application/vnd.google-apps.folder'}
-                if parent_id:
-                    metadata['parents'] = [parent_id]
-                folder = self.service.files().create(body=metadata, fields='id').execute()
-                parent_id = folder['id']
+                parent_id = self._create_folder(part, parent_id)['id']
+            resolved['/'.join(parts[:depth + 1])] = parent_id
+        if self.folder_cache is not None and resolved:
+            self.folder_cache.update(root_folder_id, resolved)
         return parent_id
 
+    def _create_folder(self, name, parent_id):
+        metadata = {'name': name, 'mimeType': FOLDER_MIME_TYPE}
+        if parent_id:
+            metadata['parents'] = [parent_id]
+        folder = self._execute(self.service.files().create(body=metadata, fields='id, name, mimeType'))
+        if self.metadata_index is not None and parent_id:
+            self.metadata_index.add(parent_id, folder)
+            # A new folder is empty, so its listing is complete
+            self.metadata_index.mark_indexed([folder['id']])
+        return folder
+
+    def invalidate_folder(self, path, root_folder_id=None):
+        """
+        Drops a folder (and everything below it) from the folder cache and the metadata index.
+        """
+        if self.folder_cache is not None:
+            folder_id = self.folder_cache.get(root_folder_id, path)
+            if folder_id and self.metadata_index is not None:
+                self.metadata_index.forget_folder(folder_id)
+            self.folder_cache.invalidate(root_folder_id, path)
+
+    def prefetch_children(self, folder_ids):
+        """
+        Lists the children of all given folders into the metadata index, batching
+        several parents into each paginated query instead of one query per name.
+
+        Returns:
+        int: The number of children indexed.
+        """
+        if self.metadata_index is None:
+            return 0
+        folder_ids = [folder_id for folder_id in dict.fromkeys(folder_ids) if folder_id]
+        count = 0
+        for start in range(0, len(folder_ids), PREFETCH_BATCH_SIZE):
+            batch = folder_ids[start:start + PREFETCH_BATCH_SIZE]
+            parents_query = ' or '.join(f"'{folder_id}' in parents" for folder_id in batch)
+            page_token = None
+            while True:
+                results = self._execute(self.service.files().list(
+                    q=f"({parents_query}) and trashed=false",
+                    spaces='drive',
+                    fields=f'nextPageToken, files({LISTING_FIELDS})',
+                    pageSize=1000,
+                    pageToken=page_token
+                ))
+                for child in results.get('files', []):
+                    for parent in child.get('parents', []):
+                        if parent in batch:
+                            self.metadata_index.add(parent, child)
+                            count += 1
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+            self.metadata_index.mark_indexed(batch)
+        return count
+
+    def warm_folder_cache(self, root_folder_id):
+        """
+        Fills the folder cache with the whole folder tree below root_folder_id
+        using one paginated listing of all folders instead of a query per segment.
+
+        Returns:
+        int: The number of folders cached.
+        """
+        if self.folder_cache is None:
+            return 0
+        children = {}
+        page_token = None
+        while True:
+            results = self._execute(self.service.files().list(
+                q=f"mimeType='{FOLDER_MIME_TYPE}' and trashed=false",
+                spaces='drive',
+                fields='nextPageToken, files(id, name, parents)',
+                pageSize=1000,
+                pageToken=page_token
+            ))
+            for folder in results.get('files', []):
+                for parent in folder.get('parents', []):
+                    children.setdefault(parent, []).append(folder)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        resolved = {}
+        pending = [(root_folder_id, '')]
+        while pending:
+            parent_id, parent_path = pending.pop()
+            for folder in children.get(parent_id, []):
+                folder_path = f"{parent_path}/{folder['name']}" if parent_path else folder['name']
+                # Keep the first match for duplicate names, like the per-segment lookup does
+                if folder_path not in resolved:
+                    resolved[folder_path] = folder['id']
+                    pending.append((folder['id'], folder_path))
+        if resolved:
+            self.folder_cache.update(root_folder_id, resolved)
+        return len(resolved)
+
     @staticmethod
     def escape_drive_query_value(value):
         """
@@ -88,3 +439,89 @@ class GoogleDriveAPI:
         if not isinstance(value, str):
             value = str(value)
         return value.replace("'", "\\'")
+
+
+class GoogleDriveClientPool:
+    """
+    Hands out one GoogleDriveAPI per thread, all sharing a single credential.
+
+    The token is read once. Each thread gets its own `service` because the underlying
+    HTTP transport is not thread-safe, and token refreshes triggered by any thread
+    are serialized under a lock so the shared credential is refreshed only once.
+    Passing credentials (and api_endpoint) skips the stored token, e.g. to talk to a
+    local Drive stand-in. A rate_limiter is shared by all the clients, so the request
+    rate and backoff apply to the process as a whole, and so is a bandwidth governor,
+    which paces the upload chunks of all the clients together. Folders are created
+    under one lock, so clients uploading to the same new folder do not create it twice.
+    """
+
+    def __init__(
+            self,
+            cred_path=None,
+            token_path=None,
+            folder_cache=None,
+            metadata_index=None,
+            metrics=None,
+            credentials=None,
+            api_endpoint=None,
+            rate_limiter=None,
+            bandwidth=None
+    ):
+        self.cred_path, self.token_path = _default_paths(cred_path, token_path)
+        self.folder_cache = folder_cache
+        self.metadata_index = metadata_index
+        self.metrics = metrics
+        self.api_endpoint = api_endpoint
+        self.rate_limiter = rate_limiter
+        self.bandwidth = bandwidth
+        self.creds = credentials
+        self._lock = threading.Lock()
+        self._folder_lock = threading.Lock()
+        self._local = threading.local()
+
+    def get(self):
+        """
+        Returns the calling thread's GoogleDriveAPI, building it on first use.
+        """
+        drive_api = getattr(self._local, 'drive_api', None)
+        if drive_api is None:
+            drive_api = GoogleDriveAPI(
+                self.cred_path, self.token_path,
+                folder_cache=self.folder_cache,
+                credentials=self._shared_credentials(),
+                metadata_index=self.metadata_index,
+                metrics=self.metrics,
+                api_endpoint=self.api_endpoint,
+                rate_limiter=self.rate_limiter,
+                bandwidth=self.bandwidth,
+                folder_lock=self._folder_lock
+            )
+            self._local.drive_api = drive_api
+        return drive_api
+
+    def _shared_credentials(self):
+        with self._lock:
+            if self.creds is None:
+                creds = load_credentials(self.cred_path, self.token_path)
+                refresh = creds.refresh
+
+                def locked_refresh(request):
+                    token = creds.token
+                    with self._lock:
+                        # Skip only if another thread replaced the token while
+                        # this one waited; a 401 retry must refresh even when
+                        # the local expiry still looks valid
+                        if creds.token == token:
+                            refresh(request)
+                            self._save_token(creds)
+
+                creds.refresh = locked_refresh
+                self.creds = creds
+            return self.creds
+
+    def _save_token(self, creds):
+        try:
+            with open(self.token_path, 'w') as token:
+                token.write(creds.to_json())
+        except OSError as e:
+            logging.warning(f"Could not save refreshed token to '{self.token_path}': {e}")
@@ -0,0 +1,50 @@
+import hashlib
+
+from googleapiclient.http import MediaFileUpload
+
+
+class HashingMediaUpload(MediaFileUpload):
+    """
+    Resumable file upload that computes the MD5 of the bytes it reads for the upload,
+    so the result can be verified against Drive's md5Checksum without a second read.
+
+    Chunks are read into memory (at most chunk_size bytes) instead of streamed, so every
+    byte sent passes through the digest. A resumed upload hashes the already committed
+    prefix first; chunks re-sent after an error are not hashed twice.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._digest = hashlib.md5()
+        self._hashed = 0
+
+    def has_stream(self):
+        return False
+
+    def getbytes(self, begin, length):
+        if begin > self._hashed:
+            self._hash_range(self._hashed, begin)
+        data = super().getbytes(begin, length)
+        if begin <= self._hashed < begin + len(data):
+            self._digest.update(data[self._hashed - begin:])
+            self._hashed = begin + len(data)
+        return data
+
+    def md5(self):
+        """
+        Returns:
+        str: The hex MD5 of the whole file, hashing whatever the upload did not read.
+        """
+        if self._hashed < self.size():
+            self._hash_range(self._hashed, self.size())
+        return self._digest.hexdigest()
+
+    def _hash_range(self, begin, end, block_size=1024 * 1024):
+        position = begin
+        while position < end:
+            block = super().getbytes(position, min(block_size, end - position))
+            if not block:
+                break
+            self._digest.update(block)
+            position += len(block)
+        self._hashed = position
@@ -0,0 +1,160 @@
+import logging
+import random
+import threading
+import time
+
+RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded')
+RETRYABLE_ERRORS = (ConnectionError, TimeoutError)
+
+
+def http_status(error):
+    """
+    Returns the HTTP status of a googleapiclient error, or None for other errors.
+    """
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+
+def is_rate_limit_error(error):
+    """
+    Returns True for Drive's 429 and 403 rate-limit responses.
+    """
+    status = http_status(error)
+    if status == 429:
+        return True
+    content = getattr(error, 'content', None) or b''
+    return status == 403 and any(reason in content for reason in RATE_LIMIT_REASONS)
+
+
+def is_retryable_error(error):
+    """
+    Returns True for errors worth retrying: rate limits, 5xx responses and dropped connections.
+    """
+    status = http_status(error)
+    return is_rate_limit_error(error) or (status is not None and status >= 500) or isinstance(error, RETRYABLE_ERRORS)
+
+
+def retry_after_seconds(error):
+    """
+    Returns the delay requested by the response's Retry-After header in seconds, or None.
+    """
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if hasattr(resp, 'get') else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class DriveRateLimiter:
+    """
+    Token bucket shared by every Drive API call of a process, with retries.
+
+    Each request takes a token; tokens refill at the current rate up to burst. Rate-limit
+    responses (429, 403 rateLimitExceeded) halve the rate, which then creeps back up with
+    every success. 429, 403 rate-limit, 5xx and connection errors are retried with
+    exponential backoff and full jitter, or after the response's Retry-After, which pauses
+    all threads rather than only the one that received it. Thread-safe.
+    """
+
+    def __init__(self, requests_per_second=10.0, burst=20, max_retries=6, base_delay=1.0, max_delay=64.0,
+                 metrics=None):
+        """
+        Parameters:
+        requests_per_second (float): Highest sustained request rate. 0 or None disables throttling, not retries.
+        burst (int): Requests allowed back to back after an idle period.
+        max_retries (int): Retries of one call before its error is raised.
+        base_delay (float): First backoff delay in seconds, doubled on each retry.
+        max_delay (float): Longest backoff delay in seconds.
+        metrics (RunMetrics): Optionally, counts requests, retries, rate-limit responses and waiting time.
+        """
+        self.max_rate = requests_per_second or 0
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self._random = random.Random()
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent.
+        """
+        waited = 0.0
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.rate:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._paused_until > now:
+                    delay = self._paused_until - now
+                elif not self.rate:
+                    break
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                else:
+                    delay = (1 - self._tokens) / self.rate
+                self._condition.wait(delay)
+                waited += time.monotonic() - now
+        self._count('drive_requests')
+        if waited:
+            self._count('drive_throttle_seconds', waited)
+
+    def call(self, function, *args, **kwargs):
+        """
+        Calls function once a token is available, retrying retryable errors.
+
+        Returns:
+        The function's result.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = self._on_error(e, attempt)
+                logging.warning(f"Drive request failed ({e}), retry {attempt + 1} of {self.max_retries} "
+                                f"in {delay:.1f} seconds")
+                self._count('drive_retries')
+                self._count('drive_throttle_seconds', delay)
+                time.sleep(delay)
+                continue
+            self._on_success()
+            return result
+
+    def execute(self, request):
+        """
+        Executes a googleapiclient request through the limiter.
+        """
+        return self.call(request.execute)
+
+    def _on_error(self, error, attempt):
+        retry_after = retry_after_seconds(error)
+        delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if is_rate_limit_error(error):
+            self._count('drive_rate_limited')
+            with self._condition:
+                if self.rate:
+                    self.rate = max(self.max_rate / 16, self.rate / 2)
+                if retry_after is not None:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        else:
+            self._count('drive_transient_errors')
+        return max(delay, retry_after or 0.0)
+
+    def _on_success(self):
+        if self.rate and self.rate < self.max_rate:
+            with self._condition:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+    def _count(self, name, amount=1):
+        if self.metrics is not None:
+            self.metrics.count(name, amount)
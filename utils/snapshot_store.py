@@ -0,0 +1,313 @@
+"""
+Content-defined chunk deduplicated snapshot store for a local or SMB backup target.
+
+Each file is split into variable-size chunks at content-defined cut points (a FastCDC-style
+gear hash), so an edit only changes the chunks around it. Chunks are stored once, compressed
+and addressed by their SHA-256; every snapshot is a small JSON manifest listing its chunks.
+
+Chunking is pure Python and costs roughly 3-5 MB/s of CPU with the GIL held. Given a process
+pool, submit chunks, hashes and writes a file in a worker process, so it does not stall the
+calling process's threads. A file identical to its latest snapshot (same size and SHA-256)
+is not chunked again.
+
+Layout below the store root:
+    chunks/<first 2 hex digits>/<sha256>      zlib-compressed chunk
+    manifests/<file name path>/<snapshot>.json
+
+Usage:
+python -m utils.snapshot_store list <root> <name>
+python -m utils.snapshot_store restore <root> <name> <destination> [--snapshot <id>]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils.folder_cache import normalize_folder_path
+
+_MASK_64 = (1 << 64) - 1
+# Fixed seed: cut points, and with them deduplication, must be stable across runs
+_GEAR_RANDOM = random.Random(0x5EED)
+_GEAR = [_GEAR_RANDOM.getrandbits(64) for _ in range(256)]
+READ_SIZE = 8 * 1024 * 1024
+
+
+def _cut_masks(avg_chunk_size):
+    bits = max(8, avg_chunk_size.bit_length() - 1)
+    # Normalized chunking: harder to cut before the average size, easier after it
+    return (1 << (bits + 1)) - 1 << (64 - bits - 1), (1 << (bits - 1)) - 1 << (64 - bits + 1)
+
+
+def iter_chunks(stream, avg_chunk_size=1024 * 1024, min_chunk_size=None, max_chunk_size=None):
+    """
+    Splits a binary stream into content-defined chunks.
+
+    Parameters:
+    stream: A binary file object.
+    avg_chunk_size (int): Target average chunk size in bytes.
+    min_chunk_size (int): Smallest chunk, bytes before it are not hashed. Defaults to avg / 4.
+    max_chunk_size (int): Largest chunk. Defaults to avg * 8.
+
+    Yields:
+    bytes: The chunks, in order.
+    """
+    min_chunk_size = min_chunk_size or avg_chunk_size // 4
+    max_chunk_size = max_chunk_size or avg_chunk_size * 8
+    strict_mask, loose_mask = _cut_masks(avg_chunk_size)
+    gear = _GEAR
+    buffer = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buffer) < max_chunk_size:
+            block = stream.read(READ_SIZE)
+            if not block:
+                eof = True
+            buffer += block
+        if not buffer:
+            return
+        if len(buffer) <= min_chunk_size:
+            yield bytes(buffer)
+            return
+        end = min(len(buffer), max_chunk_size)
+        normal = min(end, avg_chunk_size)
+        cut = end
+        fingerprint = 0
+        position = min_chunk_size
+        view = memoryview(buffer)
+        for byte in view[min_chunk_size:normal]:
+            fingerprint = ((fingerprint << 1) + gear[byte]) & _MASK_64
+            position += 1
+            if not fingerprint & strict_mask:
+                cut = position
+                break
+        else:
+            for byte in view[normal:end]:
+                fingerprint = ((fingerprint << 1) + gear[byte]) & _MASK_64
+                position += 1
+                if not fingerprint & loose_mask:
+                    cut = position
+                    break
+        view.release()
+        yield bytes(buffer[:cut])
+        del buffer[:cut]
+
+
+class SnapshotStore:
+    """
+    Versioned, chunk-deduplicated file store. Safe to use from several threads and,
+    since every file is written under a temporary name and renamed into place, from
+    several processes sharing the same target.
+    """
+    SNAPSHOT_FORMAT = '%Y%m%dT%H%M%SZ'
+
+    def __init__(self, root, avg_chunk_size=1024 * 1024, compression_level=6, executor=None):
+        """
+        Parameters:
+        root (str): Folder of the store, e.g. the SMB backup target.
+        avg_chunk_size (int): Target average chunk size in bytes.
+        compression_level (int): zlib level used for new chunks.
+        executor (ProcessPoolExecutor): Optionally, a process pool that submit runs backup in.
+        """
+        self.root = Path(root)
+        self.avg_chunk_size = avg_chunk_size
+        self.compression_level = compression_level
+        self.executor = executor
+        self._lock = threading.Lock()
+
+    def backup(self, file_path, name):
+        """
+        Stores a new snapshot of file_path under name, writing only chunks the store does not have.
+        No snapshot is written when the content equals the latest one.
+
+        Parameters:
+        file_path (str): The file to store.
+        name (str): The stored file's name, e.g. the model path.
+
+        Returns:
+        dict: 'snapshot' (id, or None if unchanged), 'size', 'sha256', 'chunks', 'new_chunks', 'new_bytes'.
+        """
+        latest = self.load_manifest(name)
+        if latest and latest['size'] == os.path.getsize(file_path):
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(READ_SIZE), b''):
+                    digest.update(block)
+            if digest.hexdigest() == latest['sha256']:
+                return {'snapshot': None, 'size': latest['size'], 'sha256': latest['sha256'],
+                        'chunks': len(latest['chunks']), 'new_chunks': 0, 'new_bytes': 0}
+        digest = hashlib.sha256()
+        chunks = []
+        new_chunks = 0
+        new_bytes = 0
+        size = 0
+        with open(file_path, 'rb') as f:
+            for chunk in iter_chunks(f, self.avg_chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+                chunk_hash = hashlib.sha256(chunk).hexdigest()
+                stored = self._store_chunk(chunk_hash, chunk)
+                if stored:
+                    new_chunks += 1
+                    new_bytes += stored
+                chunks.append([chunk_hash, len(chunk)])
+        result = {'snapshot': None, 'size': size, 'sha256': digest.hexdigest(),
+                  'chunks': len(chunks), 'new_chunks': new_chunks, 'new_bytes': new_bytes}
+        if latest and latest['sha256'] == result['sha256'] and latest['size'] == size:
+            return result
+        snapshot = self._new_snapshot_id(name)
+        manifest = {'name': normalize_folder_path(name), 'snapshot': snapshot, 'created': time.time(),
+                    'size': size, 'sha256': result['sha256'], 'chunks': chunks}
+        self._write_atomically(self._manifest_path(name, snapshot), json.dumps(manifest).encode('utf-8'))
+        result['snapshot'] = snapshot
+        return result
+
+    def submit(self, file_path, name):
+        """
+        Starts backup of file_path in the store's process pool, or runs it at once without one.
+
+        Returns:
+        Future: Resolves to the result of backup.
+        """
+        if self.executor is not None:
+            return self.executor.submit(_backup_in_process, str(self.root), self.avg_chunk_size,
+                                        self.compression_level, str(file_path), name)
+        future = Future()
+        try:
+            future.set_result(self.backup(file_path, name))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def list_snapshots(self, name):
+        """
+        Returns:
+        list: The snapshot IDs stored under name, oldest first.
+        """
+        folder = self._manifest_folder(name)
+        if not folder.is_dir():
+            return []
+        return sorted(path.stem for path in folder.glob('*.json'))
+
+    def load_manifest(self, name, snapshot=None):
+        """
+        Returns:
+        dict: The manifest of the given (by default the latest) snapshot, or None.
+        """
+        snapshots = self.list_snapshots(name)
+        if not snapshots:
+            return None
+        snapshot = snapshot or snapshots[-1]
+        if snapshot not in snapshots:
+            raise FileNotFoundError(f"Snapshot '{snapshot}' of '{name}' not found")
+        return json.loads(self._manifest_path(name, snapshot).read_text(encoding='utf-8'))
+
+    def restore(self, name, destination, snapshot=None):
+        """
+        Rebuilds a stored version chunk by chunk and checks it against the recorded SHA-256.
+
+        Parameters:
+        name (str): The stored file's name.
+        destination (str): Where to write the restored file.
+        snapshot (str): The snapshot ID, by default the latest.
+
+        Returns:
+        dict: The restored snapshot's manifest.
+        """
+        manifest = self.load_manifest(name, snapshot)
+        if manifest is None:
+            raise FileNotFoundError(f"No snapshots of '{name}' in {self.root}")
+        destination = Path(destination)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = destination.with_name(f"{destination.name}.{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk_hash, chunk_size in manifest['chunks']:
+                    chunk = zlib.decompress(self._chunk_path(chunk_hash).read_bytes())
+                    if len(chunk) != chunk_size:
+                        raise ValueError(f"Chunk {chunk_hash} has {len(chunk)} bytes, expected {chunk_size}")
+                    digest.update(chunk)
+                    f.write(chunk)
+            if digest.hexdigest() != manifest['sha256']:
+                raise ValueError(f"Restored '{name}' does not match its recorded SHA-256")
+            os.replace(temp_path, destination)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        return manifest
+
+    def _store_chunk(self, chunk_hash, chunk):
+        path = self._chunk_path(chunk_hash)
+        if path.exists():
+            return 0
+        data = zlib.compress(chunk, self.compression_level)
+        self._write_atomically(path, data)
+        return len(data)
+
+    def _new_snapshot_id(self, name):
+        with self._lock:
+            snapshot = datetime.now(timezone.utc).strftime(self.SNAPSHOT_FORMAT)
+            existing = set(self.list_snapshots(name))
+            candidate, suffix = snapshot, 1
+            while candidate in existing:
+                candidate = f"{snapshot}-{suffix}"
+                suffix += 1
+            return candidate
+
+    def _chunk_path(self, chunk_hash):
+        return self.root / 'chunks' / chunk_hash[:2] / chunk_hash
+
+    def _manifest_folder(self, name):
+        return self.root / 'manifests' / normalize_folder_path(name)
+
+    def _manifest_path(self, name, snapshot):
+        return self._manifest_folder(name) / f"{snapshot}.json"
+
+    @staticmethod
+    def _write_atomically(path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+
+def _backup_in_process(root, avg_chunk_size, compression_level, file_path, name):
+    return SnapshotStore(root, avg_chunk_size, compression_level).backup(file_path, name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    list_parser = commands.add_parser('list', help='List the snapshots of a stored file.')
+    list_parser.add_argument('root')
+    list_parser.add_argument('name')
+    restore_parser = commands.add_parser('restore', help='Rebuild a stored version of a file.')
+    restore_parser.add_argument('root')
+    restore_parser.add_argument('name')
+    restore_parser.add_argument('destination')
+    restore_parser.add_argument('--snapshot', help='Snapshot ID, by default the latest.')
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.root)
+    if args.command == 'list':
+        for snapshot in store.list_snapshots(args.name):
+            print(snapshot)
+    else:
+        manifest = store.restore(args.name, args.destination, args.snapshot)
+        print(f"Restored '{manifest['name']}' snapshot {manifest['snapshot']} ({manifest['size']} bytes) "
+              f"to {args.destination}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
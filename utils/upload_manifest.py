@@ -0,0 +1,64 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils.folder_cache import normalize_folder_path
+
+
+# noinspection SqlNoDataSourceInspection
+class UploadManifest:
+    """
+    Local record of what was last uploaded to each Drive path.
+
+    Keyed by (root_folder_id, relative file path) and storing the file ID, MD5 and size
+    of the last upload whose checksum Drive confirmed. Unchanged uploads are recognised
+    from Drive's own md5Checksum, not from this record.
+    Thread-safe.
+    """
+    CREATE_QUERY = (
+        "CREATE TABLE IF NOT EXISTS Uploads ("
+        "RootId TEXT NOT NULL, Path TEXT NOT NULL, FileId TEXT NOT NULL, "
+        "Md5 TEXT NOT NULL, Size INTEGER NOT NULL, UploadedAt REAL NOT NULL, "
+        "PRIMARY KEY (RootId, Path))"
+    )
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+        db_path (str): Path of the SQLite file.
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(self.CREATE_QUERY)
+
+    def get(self, root_folder_id, path):
+        """
+        Returns:
+        dict: {'id', 'md5Checksum', 'size'} of the last upload, or None.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT FileId, Md5, Size FROM Uploads WHERE RootId = ? AND Path = ?",
+                (root_folder_id or '', normalize_folder_path(path))
+            ).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'md5Checksum': row[1], 'size': row[2]}
+
+    def record(self, root_folder_id, path, file_id, md5, size):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO Uploads (RootId, Path, FileId, Md5, Size, UploadedAt) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (root_folder_id or '', normalize_folder_path(path), file_id, md5, int(size), time.time())
+            )
+
+    def forget(self, root_folder_id, path):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM Uploads WHERE RootId = ? AND Path = ?",
+                (root_folder_id or '', normalize_folder_path(path))
+            )
@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+# noinspection SqlNoDataSourceInspection
+class UploadSessionStore:
+    """
+    Persists resumable upload session URIs and their committed offsets, so an
+    interrupted upload continues from its last chunk on retry or in the next run.
+    Drive keeps a resumable session for about a week; older sessions are dropped.
+    Thread-safe.
+    """
+    CREATE_QUERY = (
+        "CREATE TABLE IF NOT EXISTS UploadSessions ("
+        "SessionKey TEXT PRIMARY KEY, SessionUri TEXT NOT NULL, "
+        "Offset INTEGER NOT NULL, CreatedAt REAL NOT NULL)"
+    )
+    MAX_AGE_SECONDS = 6 * 24 * 3600
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+        db_path (str): Path of the SQLite file.
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._connection:
+            self._connection.execute(self.CREATE_QUERY)
+            self._connection.execute(
+                "DELETE FROM UploadSessions WHERE CreatedAt < ?", (time.time() - self.MAX_AGE_SECONDS,))
+
+    @staticmethod
+    def make_key(file_path, folder_id, filename, file_id=None):
+        """
+        Builds a session key that changes whenever the local file or the upload target does.
+        """
+        stat = Path(file_path).stat()
+        return f"{folder_id}/{filename}|{file_id or ''}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def get(self, key):
+        """
+        Returns:
+        tuple: (session_uri, offset), or None if there is no usable session.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT SessionUri, Offset, CreatedAt FROM UploadSessions WHERE SessionKey = ?", (key,)
+            ).fetchone()
+        if row is None or row[2] < time.time() - self.MAX_AGE_SECONDS:
+            return None
+        return row[0], row[1]
+
+    def save(self, key, session_uri, offset):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO UploadSessions (SessionKey, SessionUri, Offset, CreatedAt) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(SessionKey) DO UPDATE SET SessionUri = excluded.SessionUri, Offset = excluded.Offset",
+                (key, session_uri, int(offset), time.time())
+            )
+
+    def delete(self, key):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM UploadSessions WHERE SessionKey = ?", (key,))